@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List
+from PIL import Image, ImageDraw
+from app.sampler import make_collage, make_collage_fast
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(pct / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+
+def synth_frame(i: int, size: tuple) -> Image.Image:
+    w, h = size
+    img = Image.new("RGB", size, color=((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+    d = ImageDraw.Draw(img)
+    for k in range(40):
+        x = (i * 131 + k * 97) % w
+        y = (i * 71 + k * 59) % h
+        d.rectangle((x, y, x + w // 8, y + h // 16), fill=((k * 29) % 256, (k * 83 + i) % 256, (k * 17) % 256))
+        d.text((x, y), f"frame {i} line {k}", fill=(255, 255, 255))
+    return img
+
+
+def write_frames(root: str, count: int, size: tuple, fmt: str) -> List[str]:
+    os.makedirs(root, exist_ok=True)
+    paths = []
+    for i in range(count):
+        p = os.path.join(root, f"frame_{i}.{fmt.lower()}")
+        synth_frame(i, size).save(p, format="JPEG" if fmt == "jpg" else "BMP")
+        paths.append(p)
+    return paths
+
+
+def _run_collage(name: str, paths: List[str], out_dir: str, repeat: int) -> Dict:
+    fn: Callable = make_collage_fast if name == "fast" else make_collage
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(paths, (3, 4), os.path.join(out_dir, f"collage_{name}_{i}.jpg"))
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"p50_ms": percentile(times, 50), "p95_ms": percentile(times, 95), "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_collage(args) -> int:
+    size = (args.width, args.height)
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("bmp", "jpg"):
+            paths = write_frames(os.path.join(tmp, fmt), args.frames, size, fmt)
+            for name in ("reference", "fast"):
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    res = pool.submit(_run_collage, name, paths, tmp, args.repeat).result()
+                print(f"[bench] collage {fmt} {size[0]}x{size[1]} {name:<9} p50={res['p50_ms']:.1f}ms p95={res['p95_ms']:.1f}ms peak_rss={res['peak_rss_mb']:.0f}MB")
+    return 0
+
+
+class SyntheticCapture:
+    def __init__(self, size: tuple = (1920, 1080), repeat_every: int = 4):
+        self.size = size
+        self.repeat_every = repeat_every
+        self.count = 0
+        self._last = None
+
+    def grab(self) -> Image.Image:
+        self.count += 1
+        if self._last is None or self.repeat_every <= 0 or self.count % self.repeat_every:
+            self._last = synth_frame(self.count, self.size)
+        return self._last
+
+
+def _timed(obj, name: str, samples: Dict[str, List[float]], stage: str):
+    fn = getattr(obj, name)
+
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.setdefault(stage, []).append((time.perf_counter() - t0) * 1000)
+
+    setattr(obj, name, wrapper)
+
+
+def _stage_line(name: str, values: List[float]) -> str:
+    return (f"[bench] {name:<14} n={len(values):<5} p50={percentile(values, 50):.1f}ms "
+            f"p95={percentile(values, 95):.1f}ms p99={percentile(values, 99):.1f}ms")
+
+
+def load_web(routes: List[str], requests_per_route: int, concurrency: int) -> Dict[str, List[float]]:
+    from app.web import create_app
+    app = create_app()
+    samples: Dict[str, List[float]] = {}
+    local = threading.local()
+
+    def _get(route: str):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        t0 = time.perf_counter()
+        resp = client.get(route)
+        ms = (time.perf_counter() - t0) * 1000
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{route} -> {resp.status_code}")
+        return ms
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for route in routes:
+            samples[route] = list(pool.map(_get, [route] * requests_per_route))
+    return samples
+
+
+def bench_pipeline(args) -> int:
+    from app.mockserver import MockServer
+    from app.main import Scheduler, load_settings
+    results: Dict = {"stages": {}, "web": {}}
+    mock = MockServer(
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        error_rate=args.error_rate,
+        stream=args.stream,
+        reject_styles=args.reject,
+    ).start()
+    cwd = os.getcwd()
+    settings = load_settings()
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in ("templates", "static"):
+            shutil.copytree(os.path.join(app_dir, name), os.path.join(tmp, "app", name))
+        os.chdir(tmp)
+        try:
+            settings.model_type = "openai_compatible"
+            settings.model_base_url = mock.url
+            settings.model_name = "mock"
+            settings.model_endpoints = []
+            settings.model_stream = args.stream
+            settings.model_retries = 1
+            settings.model_backoff_seconds = 0.05
+            settings.capture_frame_source = args.source
+            settings.analysis_sampler = args.sampler
+            settings.analysis_use_ocr = False
+            settings.summary_cache_enabled = args.summary_cache
+            sched = Scheduler(settings)
+            samples: Dict[str, List[float]] = results["stages"]
+            _timed(sched, "_ingest", samples, "capture")
+            _timed(sched, "_snapshot_job", samples, "snapshot")
+            _timed(sched, "_pick_frames", samples, "sample")
+            _timed(sched, "_build_collage", samples, "collage")
+            _timed(sched, "_write_collage", samples, "collage_write")
+            _timed(sched, "_run_job", samples, "analysis")
+            _timed(sched._get_provider(), "summarize", samples, "model")
+            cap = SyntheticCapture((args.width, args.height))
+            interval = max(1, settings.analysis_interval_minutes) * 60
+            start = time.time() - args.analyses * interval
+            t0 = time.perf_counter()
+            for i in range(args.analyses):
+                a, b = start + i * interval, start + (i + 1) * interval
+                for k in range(args.frames):
+                    ts = a + (k + 1) * interval / (args.frames + 1)
+                    sched._ingest(cap.grab(), ts)
+                    sched._title_buffer.append((ts, f"editor - module_{i % 7}.py - project"))
+                job = sched._snapshot_job(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(b)), a, b)
+                sched._run_job(job)
+            results["wall_seconds"] = time.perf_counter() - t0
+            sched.stop()
+            busy = sum(samples.get("analysis", [])) / 1000.0
+            results["analyses"] = args.analyses
+            results["per_minute"] = args.analyses / busy * 60 if busy > 0 else 0.0
+            if args.web_requests > 0:
+                routes = ["/api/analyses?limit=50", "/", f"/api/analysis/{int(start + interval)}"]
+                results["web"] = load_web(routes, args.web_requests, args.concurrency)
+        finally:
+            os.chdir(cwd)
+            mock.stop()
+    results["peak_rss_mb"] = peak_rss_mb()
+    results["mock"] = mock.stats()
+    for name, values in results["stages"].items():
+        print(_stage_line(name, values))
+    for route, values in results["web"].items():
+        print(_stage_line(route, values))
+    print(f"[bench] analyses={results['analyses']} per_min={results['per_minute']:.1f} wall={results['wall_seconds']:.1f}s peak_rss={results['peak_rss_mb']:.0f}MB")
+    print(f"[bench] mock {json.dumps(results['mock'])}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.bench")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("collage", help="compare make_collage with make_collage_fast")
+    p.add_argument("--width", type=int, default=3840)
+    p.add_argument("--height", type=int, default=2160)
+    p.add_argument("--frames", type=int, default=12)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_collage)
+    p = sub.add_parser("pipeline", help="capture, analysis and web API against a mock model server")
+    p.add_argument("--analyses", type=int, default=20)
+    p.add_argument("--frames", type=int, default=60, help="frames captured per analysis interval")
+    p.add_argument("--width", type=int, default=1920)
+    p.add_argument("--height", type=int, default=1080)
+    p.add_argument("--source", choices=["memory", "disk"], default="memory")
+    p.add_argument("--sampler", choices=["even", "diverse"], default="diverse")
+    p.add_argument("--summary-cache", action="store_true")
+    p.add_argument("--latency-ms", type=float, default=300)
+    p.add_argument("--jitter-ms", type=float, default=50)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--stream", action="store_true")
+    p.add_argument("--reject", action="append", default=[], choices=["multimodal", "text_only", "images_sidecar"])
+    p.add_argument("--web-requests", type=int, default=200, help="requests per web route, 0 to skip")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--json", default="", help="also write results to this file")
+    p.set_defaults(func=bench_pipeline)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,135 @@
+import re
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.change import hamming
+
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_titles(titles: List[str]) -> List[str]:
+    out = set()
+    for t in titles or []:
+        t = _DIGITS.sub("#", (t or "").lower())
+        t = " ".join(t.split())
+        if t:
+            out.add(t)
+    return sorted(out)
+
+
+def summary_key(titles: List[str], prompt: str, model: str) -> str:
+    h = hashlib.sha1()
+    for part in ("\n".join(normalize_titles(titles)), prompt or "", model or ""):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 7200.0, max_distance: int = 6):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (ts, _) = next(iter(self._entries.items()))
+            if now - ts <= self.ttl_seconds:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, phash: Optional[int]) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            found = None
+            for k, (ts, card) in reversed(self._entries.items()):
+                if k[0] != key or now - ts > self.ttl_seconds:
+                    continue
+                if phash is None or k[1] is None:
+                    match = phash is None and k[1] is None
+                else:
+                    match = hamming(k[1], phash) <= self.max_distance
+                if match:
+                    found = k
+                    break
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            ts, card = self._entries.pop(found)
+            self._entries[found] = (now, card)
+            return copy.deepcopy(card)
+
+    def put(self, key: str, phash: Optional[int], card: Dict):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._entries.pop((key, phash), None)
+            self._entries[(key, phash)] = (now, copy.deepcopy(card))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class LruCache:
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self._entries: "OrderedDict[object, Tuple[int, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            ent = self._entries.get(key)
+            if ent is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ent[1]
+
+    def put(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[0]
+            self._entries[key] = (size, value)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (n, _) = self._entries.popitem(last=False)
+                self.bytes -= n
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
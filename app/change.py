@@ -0,0 +1,52 @@
+from typing import Optional, Tuple
+from PIL import Image
+
+SIG_SIZE = (32, 18)
+
+
+def signature(img: Image.Image) -> bytes:
+    small = img.resize(SIG_SIZE, Image.BOX, reducing_gap=3.0)
+    return small.convert("L").tobytes()
+
+
+def change_score(prev: bytes, cur: bytes, cell_threshold: int = 12) -> float:
+    if not prev or len(prev) != len(cur):
+        return 1.0
+    changed = 0
+    for a, b in zip(prev, cur):
+        if a - b > cell_threshold or b - a > cell_threshold:
+            changed += 1
+    return changed / len(cur)
+
+
+class ChangeDetector:
+    def __init__(self, min_change: float = 0.01, cell_threshold: int = 12):
+        self.min_change = min_change
+        self.cell_threshold = cell_threshold
+        self._last_sig: Optional[bytes] = None
+
+    def check(self, img: Image.Image) -> Tuple[bool, float, bytes]:
+        sig = signature(img)
+        score = change_score(self._last_sig or b"", sig, self.cell_threshold)
+        changed = self._last_sig is None or score >= self.min_change
+        if changed:
+            self._last_sig = sig
+        return changed, score, sig
+
+    def reset(self):
+        self._last_sig = None
+
+
+def dhash(img: Image.Image, size: int = 8) -> int:
+    small = img.convert("L").resize((size + 1, size), Image.BILINEAR, reducing_gap=2.0)
+    px = small.tobytes()
+    bits = 0
+    for y in range(size):
+        row = px[y * (size + 1):(y + 1) * (size + 1)]
+        for x in range(size):
+            bits = (bits << 1) | (1 if row[x] > row[x + 1] else 0)
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
 import time
+from app.segment import prune_segments
 
 
 def _dir_size_mb(path: str) -> int:
@@ -32,8 +33,10 @@ def _remove_older_than(path: str, seconds: int) -> int:
 
 
 class CleanupService:
-    def __init__(self, base_dir: str, tmp_minutes: int, collages_days: int, cards_days: int, max_mb: int):
+    def __init__(self, base_dir: str, tmp_minutes: int, collages_days: int, cards_days: int, max_mb: int, frames=None, store=None):
         self.base_dir = base_dir
+        self.frames = frames
+        self.store = store
         self.tmp_minutes = tmp_minutes
         self.collages_days = collages_days
         self.cards_days = cards_days
@@ -43,19 +46,30 @@ class CleanupService:
     def stop(self):
         self._stop = True
 
+    def _prune_frames(self, frames_dir: str, before_ts: float) -> int:
+        if self.frames is not None:
+            return self.frames.prune(before_ts)
+        return prune_segments(frames_dir, before_ts)
+
     def run(self):
         while not self._stop:
             frames_dir = os.path.join(self.base_dir, "tmp_frames")
             collages_dir = os.path.join(self.base_dir, "tmp_collages")
             cards_dir = os.path.join(self.base_dir, "cards")
             analysis_dir = os.path.join(self.base_dir, "analysis")
-            c1 = _remove_older_than(frames_dir, self.tmp_minutes * 60)
+            c1 = self._prune_frames(frames_dir, time.time() - self.tmp_minutes * 60)
+            _remove_older_than(frames_dir, self.tmp_minutes * 60 + 3600)
             c2 = _remove_older_than(collages_dir, self.collages_days * 86400)
             c3 = _remove_older_than(cards_dir, self.cards_days * 86400) if self.cards_days > 0 else 0
             c4 = _remove_older_than(analysis_dir, self.cards_days * 86400) if self.cards_days > 0 else 0
+            if self.store is not None and self.cards_days > 0:
+                try:
+                    c4 += self.store.prune(time.time() - self.cards_days * 86400)
+                except Exception:
+                    pass
             total_mb = _dir_size_mb(self.base_dir)
             if total_mb > self.max_mb:
-                _remove_older_than(frames_dir, 0)
+                self._prune_frames(frames_dir, time.time())
                 _remove_older_than(collages_dir, 0)
             print(f"[cleanup] frames={c1} collages={c2} cards={c3} analysis={c4} total_mb={total_mb}")
             time.sleep(600)
\ No newline at end of file
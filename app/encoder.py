@@ -0,0 +1,109 @@
+import io
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+from PIL import Image
+
+
+def vision_tokens(width: int, height: int) -> int:
+    if width <= 0 or height <= 0:
+        return 0
+    scale = min(1.0, 2048.0 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768.0 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def plan_grid(count: int, aspect: float, target_aspect: float = 16 / 9) -> Tuple[int, int]:
+    best = (1, max(1, count))
+    best_key = None
+    for rows in range(1, count + 1):
+        cols = math.ceil(count / rows)
+        empty = rows * cols - count
+        canvas_aspect = cols * aspect / rows
+        key = (empty, abs(math.log(canvas_aspect / target_aspect)))
+        if best_key is None or key < best_key:
+            best, best_key = (rows, cols), key
+    return best
+
+
+def compose_tiles(tiles: Sequence[Image.Image], grid: Tuple[int, int], cell: Tuple[int, int]) -> Image.Image:
+    rows, cols = grid
+    cell_w, cell_h = cell
+    canvas = Image.new("RGB", (cols * cell_w, rows * cell_h), color=(0, 0, 0))
+    for idx, tile in enumerate(tiles[: rows * cols]):
+        img = tile
+        if img.width > cell_w or img.height > cell_h:
+            img = img.copy()
+            img.thumbnail(cell, Image.BILINEAR)
+        x = (idx % cols) * cell_w + (cell_w - img.width) // 2
+        y = (idx // cols) * cell_h + (cell_h - img.height) // 2
+        canvas.paste(img, (x, y))
+    return canvas
+
+
+def _encode(img: Image.Image, quality: int, buf: io.BytesIO) -> int:
+    buf.seek(0)
+    buf.truncate()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.tell()
+
+
+def encode_into(img: Image.Image, quality: int, buf: io.BytesIO) -> memoryview:
+    _encode(img, quality, buf)
+    return buf.getbuffer()
+
+
+def encode_collage_budget(
+    tiles: Sequence[Image.Image],
+    max_bytes: int = 0,
+    max_tokens: int = 0,
+    max_quality: int = 85,
+    min_quality: int = 50,
+    buffers: Optional[List[io.BytesIO]] = None,
+) -> Tuple[bytes, Dict]:
+    tiles = [t for t in tiles if t is not None]
+    if not tiles:
+        return b"", {}
+    aspects = sorted(t.width / max(1, t.height) for t in tiles)
+    aspect = aspects[len(aspects) // 2]
+    rows, cols = plan_grid(len(tiles), aspect)
+    tile_w = max(t.width for t in tiles)
+    tile_w = max(32, min(tile_w, int(max(t.height for t in tiles) * aspect)))
+    tile_h = max(18, int(round(tile_w / aspect)))
+    if max_tokens > 0:
+        while tile_w > 32 and vision_tokens(cols * tile_w, rows * tile_h) > max_tokens:
+            tile_w = int(tile_w * 0.85)
+            tile_h = max(18, int(round(tile_w / aspect)))
+    cur, spare = buffers if buffers else (io.BytesIO(), io.BytesIO())
+    size = 0
+    quality = max_quality
+    for _ in range(6):
+        canvas = compose_tiles(tiles, (rows, cols), (tile_w, tile_h))
+        size = _encode(canvas, max_quality, cur)
+        quality = max_quality
+        if max_bytes <= 0 or size <= max_bytes:
+            break
+        lo, hi = min_quality, max_quality - 1
+        found = False
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            n = _encode(canvas, mid, spare)
+            if n <= max_bytes:
+                cur, spare = spare, cur
+                size, quality, found = n, mid, True
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        if found:
+            break
+        tile_w = max(32, int(tile_w * 0.8))
+        tile_h = max(18, int(round(tile_w / aspect)))
+    meta = {
+        "grid": [rows, cols],
+        "size": [cols * tile_w, rows * tile_h],
+        "quality": quality,
+        "bytes": size,
+        "tokens": vision_tokens(cols * tile_w, rows * tile_h),
+    }
+    return (cur.getbuffer() if buffers else cur.getvalue()), meta
\ No newline at end of file
@@ -0,0 +1,121 @@
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Dict, List, Optional
+from app.ocr import OcrPipeline
+
+
+class FrameFeatures:
+    __slots__ = ("ts", "change_score", "text")
+
+    def __init__(self, ts: float, change_score: float, text: Optional[str] = None):
+        self.ts = ts
+        self.change_score = change_score
+        self.text = text
+
+
+class FeatureExtractor:
+    def __init__(self, ocr: OcrPipeline, queue_size: int = 64, max_results: int = 4096, frame_timeout: float = 10.0):
+        self.ocr = ocr
+        self.queue_size = max(1, queue_size)
+        self.max_inflight = 2 * max(1, ocr.workers)
+        self.frame_timeout = frame_timeout
+        self._queue = deque()
+        self._results = deque(maxlen=max(1, max_results))
+        self._cond = threading.Condition()
+        self._stop = False
+        self._prev_sig = b""
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.shed = 0
+        self.stalled = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame) -> bool:
+        if frame is None or not hasattr(frame, "ts"):
+            return False
+        score = getattr(frame, "change_score", 0.0)
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                low = min(range(len(self._queue)), key=lambda i: self._queue[i].change_score)
+                self.shed += 1
+                if self._queue[low].change_score >= score:
+                    return False
+                del self._queue[low]
+            self._queue.append(frame)
+            self._cond.notify()
+        return True
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(timeout=2)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "shed": self.shed,
+                "stalled": self.stalled,
+            }
+
+    def collect(self, since: float, until: Optional[float] = None) -> List[FrameFeatures]:
+        out = []
+        with self._cond:
+            for feat in reversed(self._results):
+                if feat.ts < since:
+                    break
+                if until is None or feat.ts <= until:
+                    out.append(feat)
+        out.reverse()
+        return out
+
+    def _finish(self, feat: FrameFeatures, fut):
+        try:
+            text = fut.result()
+        except Exception:
+            text = None
+        with self._cond:
+            feat.text = text
+            self.processed += 1
+            if text is None:
+                self.failed += 1
+
+    def _run(self):
+        inflight = []
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    break
+                frame = self._queue.popleft()
+            inflight = [f for f in inflight if not f.done()]
+            while len(inflight) >= self.max_inflight and not self._stop:
+                done, _ = wait(inflight, timeout=self.frame_timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    with self._cond:
+                        self.stalled += 1
+                inflight = [f for f in inflight if not f.done()]
+            try:
+                fut, self._prev_sig = self.ocr.submit(frame, self._prev_sig)
+            except Exception:
+                continue
+            if fut is None:
+                continue
+            feat = FrameFeatures(frame.ts, getattr(frame, "change_score", 0.0))
+            with self._cond:
+                self._results.append(feat)
+                self.submitted += 1
+            fut.add_done_callback(lambda f, feat=feat: self._finish(feat, f))
+            inflight.append(fut)
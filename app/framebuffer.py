@@ -0,0 +1,77 @@
+import io
+import time
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+from PIL import Image
+
+
+class Frame:
+    __slots__ = ("ts", "size", "data", "change_score", "sig", "last_ts", "repeats")
+
+    def __init__(self, ts: float, size: Tuple[int, int], data: bytes, change_score: float = 1.0, sig: bytes = b""):
+        self.ts = ts
+        self.size = size
+        self.data = data
+        self.change_score = change_score
+        self.sig = sig
+        self.last_ts = ts
+        self.repeats = 0
+
+    def open(self) -> Image.Image:
+        return Image.open(io.BytesIO(self.data))
+
+
+def encode_frame(img: Image.Image, max_width: int = 0, quality: int = 80) -> Tuple[Tuple[int, int], bytes]:
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if max_width and img.width > max_width:
+        h = max(1, img.height * max_width // img.width)
+        img = img.resize((max_width, h), Image.BILINEAR, reducing_gap=2.0)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return img.size, buf.getvalue()
+
+
+class FrameRingBuffer:
+    def __init__(self, capacity: int = 120, max_width: int = 1280, quality: int = 80):
+        self.capacity = max(1, capacity)
+        self.max_width = max_width
+        self.quality = quality
+        self._frames = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def add(self, img: Image.Image, ts: Optional[float] = None, change_score: float = 1.0, sig: bytes = b"") -> Optional[Frame]:
+        try:
+            size, data = encode_frame(img, self.max_width, self.quality)
+        except Exception:
+            return None
+        frame = Frame(ts if ts is not None else time.time(), size, data, change_score, sig)
+        with self._lock:
+            self._frames.append(frame)
+        return frame
+
+    def touch(self, ts: Optional[float] = None) -> Optional[Frame]:
+        with self._lock:
+            if not self._frames:
+                return None
+            frame = self._frames[-1]
+            frame.last_ts = ts if ts is not None else time.time()
+            frame.repeats += 1
+            return frame
+
+    def recent(self, max_count: int, since: Optional[float] = None) -> List[Frame]:
+        with self._lock:
+            frames = list(self._frames)
+        if max_count <= 0:
+            return []
+        if since is not None:
+            frames = [f for f in frames if f.last_ts >= since]
+        return frames[-max_count:]
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
\ No newline at end of file
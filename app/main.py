@@ -2,17 +2,28 @@ import os
 import sys
 import time
 import threading
-from dataclasses import dataclass
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import json
+from PIL import Image
 from app.capture import ScreenCapture
+from app.framebuffer import FrameRingBuffer
+from app.segment import SegmentStore
+from app.change import ChangeDetector, dhash
+from app.cache import SummaryCache, summary_key
+from app.pacing import AdaptivePacer
 from app.activity import ActivityTracker
-from app.sampler import list_recent_frames, sample_even, make_collage
-from app.ocr import extract_text
+from app.sampler import sample_even, sample_diverse, collage_canvas, load_tiles, IncrementalCollage
+from app.encoder import encode_collage_budget, encode_into
+from app.ocr import OcrPipeline, merge_text
+from app.extract import FeatureExtractor
 from app.model import summarize_card
 import json as _json
 from collections import deque
-import base64
+import io
 from app.cleanup import CleanupService
+from app.store import AnalysisStore, default_path
 
 def _normalize_title(title: str) -> str:
     t = (title or "").strip()
@@ -56,6 +67,27 @@ def _to_12h(t: str) -> str:
     except Exception:
         return s
 
+def _shift_clock(t: str, seconds: float) -> str:
+    s = (t or "").strip().upper()
+    ap = s[-2:] if s[-2:] in ("AM", "PM") else ""
+    try:
+        hh, mm = s[:len(s) - len(ap)].strip().split(":")[:2]
+        h = int(hh)
+        m = int(mm[:2])
+    except Exception:
+        return ""
+    if ap:
+        h = h % 12 + (12 if ap == "PM" else 0)
+    total = (h * 60 + m + int(round(seconds / 60))) % 1440
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+def _retime_cards(timeline: list, seconds: float, start: float, end: float):
+    for it in timeline:
+        if not isinstance(it, dict):
+            continue
+        it["startTime"] = _shift_clock(str(it.get("startTime", "")), seconds) or time.strftime("%H:%M", time.localtime(start))
+        it["endTime"] = _shift_clock(str(it.get("endTime", "")), seconds) or time.strftime("%H:%M", time.localtime(end))
+
 def _infer_category(titles: list) -> tuple:
     joined = " ".join(titles or []).lower()
     if any(k in joined for k in ["visual studio", "cursor", "code", "github", "gitlab", "terminal"]):
@@ -72,21 +104,75 @@ def _infer_category(titles: list) -> tuple:
 @dataclass
 class Settings:
     capture_fps: int = 1
+    capture_frame_source: str = "memory"
+    capture_buffer_frames: int = 120
+    capture_max_width: int = 1280
+    capture_jpeg_quality: int = 80
+    capture_dedup: bool = True
+    capture_min_change: float = 0.01
+    capture_adaptive: bool = True
+    capture_min_fps: float = 0.2
+    capture_max_fps: float = 4.0
+    capture_idle_after_seconds: int = 30
+    capture_burst_seconds: int = 5
+    capture_burst_change: float = 0.2
+    capture_cpu_budget: float = 0.1
+    capture_disk_budget_kbps: int = 512
     analysis_interval_minutes: int = 15
     model_type: str = "none"
     model_base_url: str = ""
     model_api_key: str = ""
     model_name: str = ""
+    model_connect_timeout_seconds: float = 5.0
+    model_read_timeout_seconds: float = 30.0
+    model_retries: int = 2
+    model_backoff_seconds: float = 0.5
+    model_deadline_seconds: float = 90.0
+    model_capability_ttl_hours: int = 24
+    model_stream: bool = True
+    model_endpoints: list = field(default_factory=list)
+    model_hedge: bool = True
+    model_hedge_min_delay_seconds: float = 2.0
     analysis_use_image: bool = True
+    analysis_sampler: str = "diverse"
+    analysis_collage_mode: str = "incremental"
+    analysis_collage_max_kb: int = 0
+    analysis_collage_max_tokens: int = 0
+    analysis_workers: int = 2
+    analysis_max_model_calls: int = 1
+    analysis_max_pending: int = 4
+    summary_cache_enabled: bool = True
+    summary_cache_max_entries: int = 256
+    summary_cache_ttl_minutes: int = 120
+    summary_cache_max_distance: int = 6
     analysis_use_ocr: bool = False
     analysis_log_capture: bool = False
     analysis_persist_raw_response: bool = False
+    extract_enabled: bool = True
+    extract_queue_size: int = 64
+    ocr_engine: str = "tesseract"
+    ocr_lang: str = "eng"
+    ocr_cmd: str = ""
+    ocr_workers: int = 2
+    ocr_timeout_seconds: int = 20
+    ocr_cache_size: int = 2048
     cleanup_tmp_frames_minutes: int = 25
     cleanup_collages_days: int = 3
     cleanup_cards_days: int = 30
     cleanup_max_data_size_mb: int = 500
 
 
+@dataclass
+class AnalysisJob:
+    ts: str
+    start: float
+    end: float
+    frames: list = field(default_factory=list)
+    titles: list = field(default_factory=list)
+    tiles: list = None
+    intervals: int = 1
+
+
 def load_settings() -> Settings:
     path = os.path.join(os.getcwd(), "config", "settings.json")
     data = None
@@ -101,16 +187,68 @@ def load_settings() -> Settings:
     if data:
         base.capture_fps = int(data.get("capture_fps", base.capture_fps))
         base.analysis_interval_minutes = int(data.get("analysis_interval_minutes", base.analysis_interval_minutes))
+        cp = data.get("capture", {})
+        base.capture_frame_source = str(cp.get("frame_source", base.capture_frame_source))
+        base.capture_buffer_frames = int(cp.get("buffer_frames", base.capture_buffer_frames))
+        base.capture_max_width = int(cp.get("max_width", base.capture_max_width))
+        base.capture_jpeg_quality = int(cp.get("jpeg_quality", base.capture_jpeg_quality))
+        base.capture_dedup = bool(cp.get("dedup", base.capture_dedup))
+        base.capture_min_change = float(cp.get("min_change", base.capture_min_change))
+        ad = cp.get("adaptive", {})
+        if isinstance(ad, bool):
+            ad = {"enabled": ad}
+        base.capture_adaptive = bool(ad.get("enabled", base.capture_adaptive))
+        base.capture_min_fps = float(ad.get("min_fps", base.capture_min_fps))
+        base.capture_max_fps = float(ad.get("max_fps", base.capture_max_fps))
+        base.capture_idle_after_seconds = int(ad.get("idle_after_seconds", base.capture_idle_after_seconds))
+        base.capture_burst_seconds = int(ad.get("burst_seconds", base.capture_burst_seconds))
+        base.capture_burst_change = float(ad.get("burst_change", base.capture_burst_change))
+        base.capture_cpu_budget = float(ad.get("cpu_budget", base.capture_cpu_budget))
+        base.capture_disk_budget_kbps = int(ad.get("disk_budget_kbps", base.capture_disk_budget_kbps))
         mp = data.get("model_provider", {})
         base.model_type = str(mp.get("type", base.model_type))
         base.model_base_url = str(mp.get("base_url", base.model_base_url))
         base.model_api_key = str(mp.get("api_key", base.model_api_key))
         base.model_name = str(mp.get("model", base.model_name))
+        base.model_connect_timeout_seconds = float(mp.get("connect_timeout_seconds", base.model_connect_timeout_seconds))
+        base.model_read_timeout_seconds = float(mp.get("read_timeout_seconds", base.model_read_timeout_seconds))
+        base.model_retries = int(mp.get("retries", base.model_retries))
+        base.model_backoff_seconds = float(mp.get("backoff_seconds", base.model_backoff_seconds))
+        base.model_deadline_seconds = float(mp.get("deadline_seconds", base.model_deadline_seconds))
+        base.model_capability_ttl_hours = int(mp.get("capability_ttl_hours", base.model_capability_ttl_hours))
+        base.model_stream = bool(mp.get("stream", base.model_stream))
+        eps = mp.get("endpoints") or []
+        base.model_endpoints = [e for e in eps if isinstance(e, dict) and e.get("base_url")] if isinstance(eps, list) else []
+        hd = mp.get("hedge", {})
+        base.model_hedge = bool(hd.get("enabled", base.model_hedge))
+        base.model_hedge_min_delay_seconds = float(hd.get("min_delay_seconds", base.model_hedge_min_delay_seconds))
         an = data.get("analysis", {})
         base.analysis_use_image = bool(an.get("use_image", base.analysis_use_image))
+        base.analysis_sampler = str(an.get("sampler", base.analysis_sampler))
+        base.analysis_collage_mode = str(an.get("collage_mode", base.analysis_collage_mode))
+        base.analysis_collage_max_kb = int(an.get("collage_max_kb", base.analysis_collage_max_kb))
+        base.analysis_collage_max_tokens = int(an.get("collage_max_tokens", base.analysis_collage_max_tokens))
+        base.analysis_workers = int(an.get("workers", base.analysis_workers))
+        base.analysis_max_model_calls = int(an.get("max_model_calls", base.analysis_max_model_calls))
+        base.analysis_max_pending = int(an.get("max_pending", base.analysis_max_pending))
+        sc = an.get("summary_cache", {})
+        base.summary_cache_enabled = bool(sc.get("enabled", base.summary_cache_enabled))
+        base.summary_cache_max_entries = int(sc.get("max_entries", base.summary_cache_max_entries))
+        base.summary_cache_ttl_minutes = int(sc.get("ttl_minutes", base.summary_cache_ttl_minutes))
+        base.summary_cache_max_distance = int(sc.get("max_distance", base.summary_cache_max_distance))
         base.analysis_use_ocr = bool(an.get("use_ocr", base.analysis_use_ocr))
         base.analysis_log_capture = bool(an.get("log_capture", base.analysis_log_capture))
         base.analysis_persist_raw_response = bool(an.get("persist_raw_response", base.analysis_persist_raw_response))
+        ex = an.get("extract", {})
+        base.extract_enabled = bool(ex.get("enabled", base.extract_enabled))
+        base.extract_queue_size = int(ex.get("queue_size", base.extract_queue_size))
+        oc = data.get("ocr", {})
+        base.ocr_engine = str(oc.get("engine", base.ocr_engine))
+        base.ocr_lang = str(oc.get("lang", base.ocr_lang))
+        base.ocr_cmd = str(oc.get("cmd", base.ocr_cmd))
+        base.ocr_workers = int(oc.get("workers", base.ocr_workers))
+        base.ocr_timeout_seconds = int(oc.get("timeout_seconds", base.ocr_timeout_seconds))
+        base.ocr_cache_size = int(oc.get("cache_size", base.ocr_cache_size))
         cl = data.get("cleanup", {})
         base.cleanup_tmp_frames_minutes = int(cl.get("tmp_frames_minutes", base.cleanup_tmp_frames_minutes))
         base.cleanup_collages_days = int(cl.get("collages_days", base.cleanup_collages_days))
@@ -125,8 +263,45 @@ def load_settings() -> Settings:
         base.model_type = "openai_compatible"
     if env_key:
         base.model_api_key = env_key
+    base.model_connect_timeout_seconds = max(0.5, min(60.0, base.model_connect_timeout_seconds))
+    base.model_read_timeout_seconds = max(1.0, min(600.0, base.model_read_timeout_seconds))
+    base.model_retries = max(0, min(10, base.model_retries))
+    base.model_backoff_seconds = max(0.0, min(60.0, base.model_backoff_seconds))
+    base.model_deadline_seconds = max(1.0, min(1800.0, base.model_deadline_seconds))
+    base.model_capability_ttl_hours = max(0, min(24 * 30, base.model_capability_ttl_hours))
+    base.model_endpoints = base.model_endpoints[:8]
+    base.model_hedge_min_delay_seconds = max(0.1, min(120.0, base.model_hedge_min_delay_seconds))
     base.capture_fps = max(1, min(30, base.capture_fps))
+    if base.capture_frame_source not in {"memory", "disk"}:
+        base.capture_frame_source = "memory"
+    base.capture_buffer_frames = max(12, min(3600, base.capture_buffer_frames))
+    base.capture_max_width = max(0, min(7680, base.capture_max_width))
+    base.capture_jpeg_quality = max(30, min(95, base.capture_jpeg_quality))
+    base.capture_min_change = max(0.0, min(1.0, base.capture_min_change))
+    base.capture_min_fps = max(0.05, min(base.capture_fps, base.capture_min_fps))
+    base.capture_max_fps = max(base.capture_fps, min(30.0, base.capture_max_fps))
+    base.capture_idle_after_seconds = max(1, min(3600, base.capture_idle_after_seconds))
+    base.capture_burst_seconds = max(0, min(300, base.capture_burst_seconds))
+    base.capture_burst_change = max(0.0, min(1.0, base.capture_burst_change))
+    base.capture_cpu_budget = max(0.0, min(1.0, base.capture_cpu_budget))
+    base.capture_disk_budget_kbps = max(0, min(1000000, base.capture_disk_budget_kbps))
     base.analysis_interval_minutes = max(1, min(1440, base.analysis_interval_minutes))
+    if base.analysis_sampler not in {"even", "diverse"}:
+        base.analysis_sampler = "diverse"
+    if base.analysis_collage_mode not in {"incremental", "batch"}:
+        base.analysis_collage_mode = "incremental"
+    base.analysis_collage_max_kb = max(0, min(20480, base.analysis_collage_max_kb))
+    base.analysis_collage_max_tokens = max(0, min(100000, base.analysis_collage_max_tokens))
+    base.analysis_workers = max(1, min(8, base.analysis_workers))
+    base.analysis_max_model_calls = max(1, min(8, base.analysis_max_model_calls))
+    base.analysis_max_pending = max(1, min(64, base.analysis_max_pending))
+    base.summary_cache_max_entries = max(1, min(10000, base.summary_cache_max_entries))
+    base.summary_cache_ttl_minutes = max(1, min(10080, base.summary_cache_ttl_minutes))
+    base.summary_cache_max_distance = max(0, min(32, base.summary_cache_max_distance))
+    base.extract_queue_size = max(1, min(4096, base.extract_queue_size))
+    base.ocr_workers = max(1, min(8, base.ocr_workers))
+    base.ocr_timeout_seconds = max(1, min(300, base.ocr_timeout_seconds))
+    base.ocr_cache_size = max(0, min(100000, base.ocr_cache_size))
     base.cleanup_tmp_frames_minutes = max(1, min(1440, base.cleanup_tmp_frames_minutes))
     base.cleanup_collages_days = max(0, min(365, base.cleanup_collages_days))
     base.cleanup_cards_days = max(0, min(365, base.cleanup_cards_days))
@@ -134,14 +309,131 @@ def load_settings() -> Settings:
     return base
 
 
+def build_provider(settings: Settings, pool_size: int = 4):
+    from app.provider import OpenAICompatibleProvider, CapabilityCache, make_session
+    caps = None
+    if settings.model_capability_ttl_hours > 0:
+        caps = CapabilityCache(
+            os.path.join(os.getcwd(), "data", "provider_caps.json"),
+            ttl_seconds=settings.model_capability_ttl_hours * 3600,
+        )
+    endpoints = []
+    if settings.model_base_url:
+        endpoints.append({
+            "base_url": settings.model_base_url,
+            "api_key": settings.model_api_key,
+            "model": settings.model_name,
+        })
+    endpoints.extend(settings.model_endpoints)
+    providers = [OpenAICompatibleProvider(
+        base_url=str(ep.get("base_url")),
+        api_key=str(ep.get("api_key") or ""),
+        model=str(ep.get("model") or settings.model_name or "gpt-4o-mini"),
+        session=make_session(pool_size),
+        connect_timeout=settings.model_connect_timeout_seconds,
+        read_timeout=settings.model_read_timeout_seconds,
+        retries=settings.model_retries,
+        backoff=settings.model_backoff_seconds,
+        deadline=settings.model_deadline_seconds,
+        caps=caps,
+        stream=settings.model_stream,
+    ) for ep in endpoints]
+    if len(providers) == 1:
+        return providers[0]
+    from app.router import EndpointRouter
+    return EndpointRouter(
+        providers,
+        hedge=settings.model_hedge,
+        hedge_min_delay=settings.model_hedge_min_delay_seconds,
+    )
+
+
+def load_system_prompt(path: str = "") -> str:
+    path = path or os.path.join(os.getcwd(), "prompt.txt")
+    if not os.path.exists(path):
+        return ""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception:
+        return ""
+
+
 class Scheduler:
     def __init__(self, settings: Settings):
         self.settings = settings
         self._stop = threading.Event()
         self._threads = []
-        self._cap = ScreenCapture(out_dir=os.path.join(os.getcwd(), "data", "tmp_frames"))
+        self._frames_dir = os.path.join(os.getcwd(), "data", "tmp_frames")
+        self._cap = ScreenCapture(out_dir=self._frames_dir)
         self._tracker = ActivityTracker()
-        self._title_buffer = deque(maxlen=max(120, self.settings.analysis_interval_minutes * 60))
+        self._ocr = None
+        if self.settings.analysis_use_ocr:
+            self._ocr = OcrPipeline(
+                engine=self.settings.ocr_engine,
+                workers=self.settings.ocr_workers,
+                cache_size=self.settings.ocr_cache_size,
+                timeout=self.settings.ocr_timeout_seconds,
+                lang=self.settings.ocr_lang,
+                cmd=self.settings.ocr_cmd,
+            )
+        self._extractor = None
+        if self.settings.extract_enabled and self._ocr is not None and self._ocr.available():
+            self._extractor = FeatureExtractor(
+                ocr=self._ocr,
+                queue_size=self.settings.extract_queue_size,
+                frame_timeout=self.settings.ocr_timeout_seconds,
+            )
+        if self.settings.capture_frame_source == "memory":
+            self._frames = FrameRingBuffer(
+                capacity=self.settings.capture_buffer_frames,
+                max_width=self.settings.capture_max_width,
+                quality=self.settings.capture_jpeg_quality,
+            )
+        else:
+            self._frames = SegmentStore(
+                root=self._frames_dir,
+                max_width=self.settings.capture_max_width,
+                quality=self.settings.capture_jpeg_quality,
+                on_frame=self._extractor.submit if self._extractor is not None else None,
+            )
+        self._detector = ChangeDetector(min_change=self.settings.capture_min_change)
+        self._collage = None
+        if self.settings.analysis_collage_mode == "incremental":
+            self._collage = IncrementalCollage(sampler=self.settings.analysis_sampler)
+        self._pacer = None
+        if self.settings.capture_adaptive:
+            self._pacer = AdaptivePacer(
+                base_fps=self.settings.capture_fps,
+                min_fps=self.settings.capture_min_fps,
+                max_fps=self.settings.capture_max_fps,
+                idle_after_seconds=self.settings.capture_idle_after_seconds,
+                burst_seconds=self.settings.capture_burst_seconds,
+                burst_change=self.settings.capture_burst_change,
+                min_change=self.settings.capture_min_change,
+                cpu_budget=self.settings.capture_cpu_budget,
+                disk_budget_kbps=self.settings.capture_disk_budget_kbps,
+            )
+        self._provider = None
+        self._summary_cache = None
+        if self.settings.summary_cache_enabled:
+            self._summary_cache = SummaryCache(
+                max_entries=self.settings.summary_cache_max_entries,
+                ttl_seconds=self.settings.summary_cache_ttl_minutes * 60,
+                max_distance=self.settings.summary_cache_max_distance,
+            )
+        self._jobs = ThreadPoolExecutor(max_workers=self.settings.analysis_workers)
+        self._jobs_lock = threading.Lock()
+        self._jobs_pending = 0
+        self._model_slots = threading.BoundedSemaphore(self.settings.analysis_max_model_calls)
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        data_dir = os.path.join(os.getcwd(), "data")
+        self._store = AnalysisStore(default_path(data_dir))
+        self._store.migrate_once(os.path.join(data_dir, "analysis"))
+        self._local = threading.local()
+        fps = self.settings.capture_max_fps if self.settings.capture_adaptive else self.settings.capture_fps
+        span = self.settings.analysis_interval_minutes * 60 * (self.settings.analysis_max_pending + 1)
+        self._title_buffer = deque(maxlen=max(120, int(fps * span)))
 
     def start(self):
         t1 = threading.Thread(target=self._capture_loop, daemon=True)
@@ -155,36 +447,224 @@ class Scheduler:
         self._stop.set()
         for t in self._threads:
             t.join(timeout=2)
+        self._jobs.shutdown(wait=False, cancel_futures=True)
+        self._writer.shutdown(wait=True)
+        if self._provider is not None:
+            self._provider.close()
+        if isinstance(self._frames, SegmentStore):
+            self._frames.close()
+        if self._extractor is not None:
+            self._extractor.stop()
+        if self._ocr is not None:
+            self._ocr.close()
 
     def _capture_loop(self):
         interval = 1.0 / max(1, self.settings.capture_fps)
+        last_written = 0
         while not self._stop.is_set():
             ts = time.strftime("%Y-%m-%d %H:%M:%S")
-            path = self._cap.capture_to_file()
+            now = time.time()
+            img = self._cap.grab()
+            saved = False
+            score = 0.0
+            if img is not None:
+                saved, score = self._ingest(img, now)
             title, pid = self._tracker.get_foreground_activity()
             if self.settings.analysis_log_capture:
                 info = f"title={title or ''} pid={pid or ''}"
-                print(f"[capture] {ts} saved={bool(path)} {info}")
+                print(f"[capture] {ts} saved={saved} change={score:.3f} {info}")
             if title:
                 self._title_buffer.append((time.time(), title))
-            time.sleep(interval)
+            if self._pacer is not None:
+                written = getattr(self._frames, "bytes_written", 0)
+                wait = self._pacer.next_interval(title, score, time.time() - now, written - last_written)
+                last_written = written
+                time.sleep(max(0.0, wait - (time.time() - now)))
+            else:
+                time.sleep(interval)
+
+    def _ingest(self, img: Image.Image, now: float) -> tuple:
+        changed, score, sig = self._detector.check(img)
+        if not changed and self.settings.capture_dedup:
+            if isinstance(self._frames, FrameRingBuffer):
+                self._frames.touch(now)
+            return False, score
+        frame = self._frames.add(img, now, score, sig)
+        if self._extractor is not None and isinstance(self._frames, FrameRingBuffer):
+            self._extractor.submit(frame)
+        if self._collage is not None:
+            self._collage.add(img, now, score, sig)
+        return bool(frame), score
 
     def _analysis_loop(self):
         interval = max(1, self.settings.analysis_interval_minutes) * 60
+        last_end = time.time()
+        next_due = (int(last_end // interval) + 1) * interval
         while not self._stop.is_set():
-            time.sleep(interval)
-            ts = time.strftime("%Y-%m-%d %H:%M:%S")
-            self._do_analysis(ts)
+            now = time.time()
+            if now < next_due:
+                self._stop.wait(min(30.0, next_due - now))
+                continue
+            next_due = (int(now // interval) + 1) * interval
+            with self._jobs_lock:
+                busy = self._jobs_pending >= self.settings.analysis_max_pending
+            if busy:
+                print(f"[analysis] {time.strftime('%Y-%m-%d %H:%M:%S')} queue full, batching into next interval")
+                continue
+            job = self._snapshot_job(time.strftime("%Y-%m-%d %H:%M:%S"), last_end, now)
+            last_end = now
+            self._submit_job(job)
+
+    def _snapshot_job(self, ts: str, start: float, end: float) -> AnalysisJob:
+        interval = max(1, self.settings.analysis_interval_minutes) * 60
+        frames = [f for f in self._frames.recent(120, since=start) if f.ts <= end]
+        if isinstance(self._frames, SegmentStore):
+            self._frames.rotate()
+            self._detector.reset()
+        tiles = None
+        if self._collage is not None and len(self._collage) > 0:
+            tiles = self._collage.tiles()
+            self._collage.reset()
+        titles = [t for ts2, t in list(self._title_buffer) if start <= ts2 <= end]
+        while self._title_buffer and self._title_buffer[0][0] <= end:
+            self._title_buffer.popleft()
+        return AnalysisJob(
+            ts=ts,
+            start=start,
+            end=end,
+            frames=frames,
+            titles=titles,
+            tiles=tiles,
+            intervals=max(1, int(round((end - start) / interval))),
+        )
+
+    def _submit_job(self, job: AnalysisJob):
+        with self._jobs_lock:
+            self._jobs_pending += 1
+
+        def _run():
+            try:
+                self._run_job(job)
+            except Exception as e:
+                print(f"[analysis] {job.ts} failed: {e}")
+            finally:
+                with self._jobs_lock:
+                    self._jobs_pending -= 1
+
+        try:
+            self._jobs.submit(_run)
+        except RuntimeError:
+            with self._jobs_lock:
+                self._jobs_pending -= 1
+
+    def _get_provider(self):
+        if self._provider is None:
+            self._provider = build_provider(self.settings)
+        return self._provider
+
+    def _collage_hash(self, data: bytes):
+        if not data:
+            return None
+        try:
+            img = Image.open(io.BytesIO(data))
+            img.draft("L", (64, 64))
+            return dhash(img)
+        except Exception:
+            return None
+
+    def _pick_frames(self, frames: list) -> list:
+        if self.settings.analysis_sampler == "diverse":
+            return sample_diverse(frames, 12)
+        return sample_even(frames, 12)
+
+    def _jpeg_buffers(self) -> list:
+        bufs = getattr(self._local, "jpeg", None)
+        if bufs is None:
+            bufs = self._local.jpeg = [io.BytesIO(), io.BytesIO()]
+        return bufs
+
+    def _build_collage(self, tiles: list, picked: list, out_path: str) -> tuple:
+        max_kb = self.settings.analysis_collage_max_kb
+        max_tokens = self.settings.analysis_collage_max_tokens
+        if max_kb or max_tokens:
+            if tiles is None:
+                tiles = load_tiles(picked, (640, 640))
+
+            def _encode(bufs):
+                return encode_collage_budget(tiles, max_bytes=max_kb * 1024, max_tokens=max_tokens, buffers=bufs)
+        else:
+            canvas = self._collage.compose(tiles) if tiles and self._collage is not None else collage_canvas(picked, (3, 4))
+            if canvas is None:
+                return "", b"", {}
+
+            def _encode(bufs):
+                return encode_into(canvas, 70, bufs[0]), {}
+        try:
+            data, meta = _encode(self._jpeg_buffers())
+        except BufferError:
+            self._local.jpeg = None
+            data, meta = _encode(self._jpeg_buffers())
+        if not len(data):
+            return "", b"", meta
+        return out_path, data, meta
+
+    def _write_collage(self, path: str, data) -> bool:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            return True
+        except Exception:
+            return False
+
+    def _write_partial(self, base_ts: int, ts: str, collage: str, model: str, cards: list):
+        timeline = []
+        for it in cards:
+            it = dict(it)
+            it["startTime"] = _to_12h(str(it.get("startTime", "")))
+            it["endTime"] = _to_12h(str(it.get("endTime", "")))
+            timeline.append(it)
+        try:
+            self._store.put(base_ts, {
+                "time": ts,
+                "title": _normalize_title(timeline[0].get("title")),
+                "summary": _normalize_summary(timeline[0].get("summary")),
+                "timeline": timeline,
+                "collage": collage,
+                "provider": "openai_compatible",
+                "model": model,
+                "provider_fallback": "none",
+                "source": "model",
+                "partial": True,
+            })
+        except Exception:
+            pass
 
     def _do_analysis(self, ts: str):
-        frames = list_recent_frames(os.path.join(os.getcwd(), "data", "tmp_frames"), 120)
-        picked = sample_even(frames, 12)
+        now = time.time()
+        job = self._snapshot_job(ts, now - self.settings.analysis_interval_minutes * 60, now)
+        self._run_job(job)
+
+    def _run_job(self, job: AnalysisJob):
+        ts = job.ts
+        base_ts = int(job.end)
         collage_dir = os.path.join(os.getcwd(), "data", "tmp_collages")
-        collage_path = os.path.join(collage_dir, f"collage_{int(time.time())}.jpg")
-        out = make_collage(picked, (3, 4), collage_path)
-        text = extract_text(picked) if self.settings.analysis_use_ocr else ""
+        collage_path = os.path.join(collage_dir, f"collage_{base_ts}.jpg")
+        picked = []
+        extracted = self._extractor is not None
+        if not job.tiles or (self._ocr is not None and not extracted):
+            picked = self._pick_frames(job.frames)
+        out, collage_data, collage_meta = self._build_collage(job.tiles, picked, collage_path)
+        if extracted:
+            text = merge_text([f.text for f in self._extractor.collect(job.start, job.end)])
+            st = self._extractor.stats()
+            print(f"[extract] {ts} processed={st['processed']} failed={st['failed']} shed={st['shed']} stalled={st['stalled']} queued={st['queued']}")
+        elif self._ocr is not None:
+            text = self._ocr.extract(picked)
+        else:
+            text = ""
         card_info = {
-            "window_titles": [t for ts2, t in self._title_buffer if time.time() - ts2 <= self.settings.analysis_interval_minutes * 60][-10:],
+            "window_titles": job.titles[-10:],
             "ocr_text": text,
             "apps": [],
             "domains": [],
@@ -192,33 +672,60 @@ class Scheduler:
         card = None
         provider_used = "local"
         model_used = ""
-        collage_b64 = ""
-        if self.settings.analysis_use_image and out and os.path.exists(out):
-            with open(out, "rb") as f:
-                collage_b64 = base64.b64encode(f.read()).decode("ascii")
-        if self.settings.model_type == "openai_compatible" and self.settings.model_base_url:
+        cache_hit = False
+        pending_write = []
+        write_lock = threading.Lock()
+
+        def _persist():
+            with write_lock:
+                if len(collage_data) and not pending_write:
+                    pending_write.append(self._writer.submit(self._write_collage, out, collage_data))
+
+        image = None
+        if self.settings.analysis_use_image and len(collage_data):
+            image = collage_data
+        if self.settings.model_type == "openai_compatible" and (self.settings.model_base_url or self.settings.model_endpoints):
             try:
-                from app.provider import OpenAICompatibleProvider
-                prov = OpenAICompatibleProvider(
-                    base_url=self.settings.model_base_url,
-                    api_key=self.settings.model_api_key,
-                    model=self.settings.model_name or "gpt-4o-mini"
-                )
-                sys_prompt = ""
-                ppath = os.path.join(os.getcwd(), "prompt.txt")
-                if os.path.exists(ppath):
-                    try:
-                        with open(ppath, "r", encoding="utf-8") as pf:
-                            sys_prompt = pf.read()
-                    except Exception:
-                        sys_prompt = ""
-                card = prov.summarize(card_info, collage_b64 if self.settings.analysis_use_image else "", sys_prompt)
+                prov = self._get_provider()
+                sys_prompt = load_system_prompt()
+                cache_key = None
+                cache_hash = None
+                if self._summary_cache is not None:
+                    cache_key = summary_key(card_info["window_titles"], sys_prompt, prov.model)
+                    if image is not None:
+                        cache_hash = self._collage_hash(image)
+                    card = self._summary_cache.get(cache_key, cache_hash)
+                    cache_hit = card is not None
+                    if cache_hit and isinstance(card.get("timeline"), list):
+                        _retime_cards(card["timeline"], base_ts - int(card.get("cached_from") or base_ts), job.start, job.end)
+                streamed = []
+
+                def _on_card(i: int, it: dict):
+                    del streamed[i:]
+                    streamed.append(it)
+                    self._write_partial(base_ts, ts, out, prov.model, streamed)
+
+                if not cache_hit:
+                    with self._model_slots:
+                        card = prov.summarize(card_info, "", sys_prompt, on_card=_on_card, collage=image, on_sent=_persist)
+                    if self._summary_cache is not None and card:
+                        cached = {k: v for k, v in card.items() if k != "raw_response"}
+                        cached["cached_from"] = base_ts
+                        self._summary_cache.put(cache_key, cache_hash, cached)
                 provider_used = "openai_compatible"
-                model_used = prov.model
+                model_used = (card or {}).get("model") or prov.model
             except Exception:
                 card = None
         if not card:
             card = summarize_card(card_info)
+        _persist()
+        if pending_write and not pending_write[0].result():
+            out = ""
+        if isinstance(collage_data, memoryview):
+            try:
+                collage_data.release()
+            except BufferError:
+                pass
         title = _normalize_title(card.get("title"))
         summary = _normalize_summary(card.get("summary"))
         timeline = card.get("timeline") if isinstance(card.get("timeline"), list) else None
@@ -240,10 +747,6 @@ class Scheduler:
                 "appSites": {"primary": (card_info.get("window_titles") or [""])[-1] or ""}
             }]
             card["source"] = card.get("source") or "heuristic"
-        cards_dir = os.path.join(os.getcwd(), "data", "analysis")
-        os.makedirs(cards_dir, exist_ok=True)
-        base_ts = int(time.time())
-        primary_path = os.path.join(cards_dir, f"analysis_{base_ts}.json")
         provider_fallback = card.get("provider_fallback") or "none"
         obj = {
             "time": ts,
@@ -251,58 +754,37 @@ class Scheduler:
             "summary": summary,
             "timeline": timeline,
             "collage": out,
+            "collage_meta": collage_meta,
             "provider": provider_used,
             "model": model_used,
             "provider_fallback": provider_fallback,
-            "source": card.get("source") or ("model" if provider_used != "local" else "heuristic")
+            "source": card.get("source") or ("model" if provider_used != "local" else "heuristic"),
+            "interval_start": int(job.start),
+            "interval_end": int(job.end),
+            "intervals": job.intervals,
+            "window_titles": card_info["window_titles"],
         }
-        try:
-            with open(primary_path, "w", encoding="utf-8") as f:
-                f.write(_json.dumps(obj, ensure_ascii=False))
-        except Exception:
-            pass
-        split_paths = []
-        if timeline and len(timeline) > 1:
-            for i, it in enumerate(timeline):
-                p = os.path.join(cards_dir, f"analysis_{base_ts}_{i}.json")
-                try:
-                    with open(p, "w", encoding="utf-8") as f:
-                        f.write(_json.dumps({
-                            "time": ts,
-                            "card": it,
-                            "collage": out,
-                            "provider": provider_used,
-                            "model": model_used,
-                            "source": obj["source"],
-                        }, ensure_ascii=False))
-                except Exception:
-                    pass
-                split_paths.append(p)
-            index_path = os.path.join(cards_dir, f"analysis_{base_ts}_index.json")
-            try:
-                with open(index_path, "w", encoding="utf-8") as f:
-                    f.write(_json.dumps({
-                        "primary": primary_path,
-                        "parts": split_paths
-                    }, ensure_ascii=False))
-            except Exception:
-                pass
+        if card_info["ocr_text"]:
+            obj["ocr_text"] = card_info["ocr_text"]
+        if card.get("endpoint"):
+            obj["endpoint"] = card.get("endpoint")
+            obj["hedged"] = bool(card.get("hedged"))
+        if self._summary_cache is not None and provider_used != "local":
+            stats = self._summary_cache.stats()
+            obj["summary_cache"] = {
+                "hit": cache_hit,
+                "cached_from": card.get("cached_from") if cache_hit else None,
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+            }
         raw = card.get("raw_response")
-        persist_raw = False
+        if not self.settings.analysis_persist_raw_response or raw is None or len(_json.dumps(raw, ensure_ascii=False)) > 1000000:
+            raw = None
         try:
-            persist_raw = bool(getattr(self.settings, "analysis_persist_raw_response", False))
-        except Exception:
-            persist_raw = False
-        if persist_raw and raw is not None:
-            try:
-                s = _json.dumps(raw, ensure_ascii=False)
-                if len(s) <= 1000000:
-                    raw_path = os.path.join(cards_dir, f"raw_{base_ts}.json")
-                    with open(raw_path, "w", encoding="utf-8") as f:
-                        f.write(s)
-            except Exception:
-                pass
-        print(f"[analysis] {ts} provider={provider_used} model={model_used} title={title} saved={os.path.basename(primary_path)}")
+            self._store.put(base_ts, obj, raw)
+        except Exception as e:
+            print(f"[analysis] {ts} store write failed: {e}")
+        print(f"[analysis] {ts} provider={provider_used} model={model_used} title={title} saved={base_ts}")
 
     def _cleanup_loop(self):
         base_dir = os.path.join(os.getcwd(), "data")
@@ -312,6 +794,8 @@ class Scheduler:
             collages_days=self.settings.cleanup_collages_days,
             cards_days=self.settings.cleanup_cards_days,
             max_mb=self.settings.cleanup_max_data_size_mb,
+            frames=self._frames if isinstance(self._frames, SegmentStore) else None,
+            store=self._store,
         )
         while not self._stop.is_set():
             svc.run()
@@ -342,4 +826,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,226 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Iterable, Optional
+
+
+def payload_style(body: Dict) -> str:
+    if body.get("images"):
+        return "images_sidecar"
+    for msg in body.get("messages") or []:
+        content = msg.get("content")
+        if isinstance(content, list) and any(p.get("type") == "image_url" for p in content if isinstance(p, dict)):
+            return "multimodal"
+    return "text_only"
+
+
+def fake_cards(seed: int, count: int = 3) -> list:
+    rnd = random.Random(seed)
+    cats = [("Work", "Coding"), ("Work", "Docs"), ("Personal", "Browsing"), ("Work", "Meetings")]
+    cards = []
+    for i in range(count):
+        cat, sub = rnd.choice(cats)
+        start = 9 * 60 + i * 5
+        cards.append({
+            "startTime": f"{start // 60:02d}:{start % 60:02d}",
+            "endTime": f"{(start + 5) // 60:02d}:{(start + 5) % 60:02d}",
+            "category": cat,
+            "subcategory": sub,
+            "title": f"Synthetic {sub.lower()} session {seed % 1000}",
+            "summary": f"Mock summary {i} for request {seed}.",
+            "detailedSummary": f"Mock detailed summary {i} for request {seed}.",
+            "appSites": {"primary": "mock"},
+        })
+    return cards
+
+
+class MockServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.5,
+        jitter: float = 0.1,
+        error_rate: float = 0.0,
+        stream: bool = True,
+        reject_styles: Iterable[str] = (),
+        reject_stream: bool = False,
+        chunk_delay: float = 0.02,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream = stream
+        self.reject_styles = set(reject_styles)
+        self.reject_stream = reject_stream
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.completed = 0
+        self.connections = 0
+        self.errors = 0
+        self.rejected = 0
+        self.bytes_in = 0
+        self.styles: Dict[str, int] = {}
+        self._lock = threading.Condition()
+        self._rnd = random.Random(seed)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def _send(self, status: int, body: bytes, ctype: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                try:
+                    self._handle()
+                finally:
+                    with server._lock:
+                        server.completed += 1
+                        server._lock.notify_all()
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                try:
+                    body = json.loads(raw)
+                except Exception:
+                    self._send(400, b'{"error":"invalid json"}')
+                    return
+                style = payload_style(body)
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_in += len(raw)
+                    server.styles[style] = server.styles.get(style, 0) + 1
+                    seq = server.requests
+                    fail = server._rnd.random() < server.error_rate
+                    delay = max(0.0, server.latency + server._rnd.uniform(-server.jitter, server.jitter))
+                if style in server.reject_styles:
+                    with server._lock:
+                        server.rejected += 1
+                    self._send(400, json.dumps({"error": f"unsupported payload style {style}"}).encode())
+                    return
+                if body.get("stream") and server.reject_stream:
+                    with server._lock:
+                        server.rejected += 1
+                    self._send(400, b'{"error":"streaming not supported"}')
+                    return
+                time.sleep(delay)
+                if fail:
+                    with server._lock:
+                        server.errors += 1
+                    self._send(503, b'{"error":"injected failure"}')
+                    return
+                content = json.dumps(fake_cards(seq))
+                if body.get("stream") and server.stream:
+                    self._stream(content, body.get("model") or "mock")
+                    return
+                self._send(200, json.dumps({
+                    "id": f"mock-{seq}",
+                    "model": body.get("model") or "mock",
+                    "choices": [{"message": {"role": "assistant", "content": content}}],
+                }).encode())
+
+            def _stream(self, content: str, model: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                step = max(1, len(content) // 8)
+                for i in range(0, len(content), step):
+                    chunk = {"model": model, "choices": [{"delta": {"content": content[i:i + step]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(server.chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def wait_completed(self, count: int, timeout: float) -> bool:
+        with self._lock:
+            return self._lock.wait_for(lambda: self.completed >= count, timeout)
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "completed": self.completed,
+                "connections": self.connections,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "bytes_in": self.bytes_in,
+                "styles": dict(self.styles),
+            }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.mockserver", description="fake OpenAI-compatible /chat/completions endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--reject", action="append", default=[], choices=["multimodal", "text_only", "images_sidecar"])
+    parser.add_argument("--reject-stream", action="store_true", help="answer 400 to stream=true requests")
+    args = parser.parse_args(argv)
+    server = MockServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        error_rate=args.error_rate,
+        stream=not args.no_stream,
+        reject_styles=args.reject,
+        reject_stream=args.reject_stream,
+    ).start()
+    print(f"[mock] serving {server.url}/chat/completions")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"[mock] {server.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
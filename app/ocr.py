@@ -1,6 +1,244 @@
-from typing import List
-import os
+from typing import Dict, List, Optional, Sequence, Tuple
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from PIL import Image
+from app.change import SIG_SIZE, signature
 
 
-def extract_text(paths: List[str]) -> str:
-    return ""
\ No newline at end of file
+class OcrEngine:
+    name = "none"
+
+    def __init__(self, **opts):
+        self.opts = opts
+
+    def available(self) -> bool:
+        return False
+
+    def recognize(self, img: Image.Image) -> str:
+        return ""
+
+
+class TesseractEngine(OcrEngine):
+    name = "tesseract"
+
+    def available(self) -> bool:
+        try:
+            import pytesseract
+            cmd = self.opts.get("cmd")
+            if cmd:
+                pytesseract.pytesseract.tesseract_cmd = cmd
+            pytesseract.get_tesseract_version()
+            return True
+        except Exception:
+            return False
+
+    def recognize(self, img: Image.Image) -> str:
+        import pytesseract
+        cmd = self.opts.get("cmd")
+        if cmd:
+            pytesseract.pytesseract.tesseract_cmd = cmd
+        return pytesseract.image_to_string(img.convert("L"), lang=self.opts.get("lang") or "eng")
+
+
+ENGINES = {
+    "none": OcrEngine,
+    "tesseract": TesseractEngine,
+}
+
+_worker_engines: Dict[Tuple, OcrEngine] = {}
+
+
+def get_engine(name: str, **opts) -> OcrEngine:
+    cls = ENGINES.get(name) or OcrEngine
+    return cls(**opts)
+
+
+def _ocr_job(engine: str, opts: Dict, data: bytes, box: Optional[Tuple[int, int, int, int]]) -> str:
+    key = (engine, tuple(sorted(opts.items())))
+    eng = _worker_engines.get(key)
+    if eng is None:
+        eng = get_engine(engine, **opts)
+        _worker_engines[key] = eng
+    img = Image.open(io.BytesIO(data))
+    if box:
+        img = img.crop(box)
+    return eng.recognize(img)
+
+
+def _frame_bytes(item) -> bytes:
+    if hasattr(item, "read"):
+        return item.read()
+    data = getattr(item, "data", None)
+    if data:
+        return bytes(data)
+    with open(item, "rb") as f:
+        return f.read()
+
+
+def _frame_sig(item, data: bytes) -> bytes:
+    sig = getattr(item, "sig", b"")
+    if sig:
+        return sig
+    return signature(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def changed_box(prev_sig: bytes, sig: bytes, size: Tuple[int, int], cell_threshold: int = 12, margin: int = 1) -> Optional[Tuple[int, int, int, int]]:
+    gw, gh = SIG_SIZE
+    if not prev_sig or len(prev_sig) != len(sig) or len(sig) != gw * gh:
+        return (0, 0, size[0], size[1])
+    x0, y0, x1, y1 = gw, gh, -1, -1
+    for i, (a, b) in enumerate(zip(prev_sig, sig)):
+        if abs(a - b) > cell_threshold:
+            x, y = i % gw, i // gw
+            x0, y0, x1, y1 = min(x0, x), min(y0, y), max(x1, x), max(y1, y)
+    if x1 < 0:
+        return None
+    x0, y0 = max(0, x0 - margin), max(0, y0 - margin)
+    x1, y1 = min(gw, x1 + 1 + margin), min(gh, y1 + 1 + margin)
+    w, h = size
+    return (x0 * w // gw, y0 * h // gh, x1 * w // gw, y1 * h // gh)
+
+
+def _resolved(text: str) -> Future:
+    fut = Future()
+    fut.set_result(text)
+    return fut
+
+
+def merge_text(texts: Sequence[Optional[str]], max_chars: int = 2000) -> str:
+    seen = set()
+    lines = []
+    for text in texts:
+        for line in (text or "").splitlines():
+            line = " ".join(line.split())
+            if len(line) < 3 or line in seen:
+                continue
+            seen.add(line)
+            lines.append(line)
+    return "\n".join(lines)[:max_chars]
+
+
+class OcrPipeline:
+    def __init__(self, engine: str = "tesseract", workers: int = 2, cache_size: int = 2048, timeout: float = 20.0, max_chars: int = 2000, **opts):
+        self.engine = engine
+        self.opts = opts
+        self.workers = max(1, workers)
+        self.cache_size = max(0, cache_size)
+        self.timeout = timeout
+        self.max_chars = max_chars
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._available: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = get_engine(self.engine, **self.opts).available()
+        return self._available
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+            return text
+
+    def _cache_put(self, key: str, text: str):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _prepare(self, item, prev_sig: bytes) -> Optional[Tuple[bytes, bytes, Optional[Tuple[int, int, int, int]]]]:
+        try:
+            data = _frame_bytes(item)
+            sig = _frame_sig(item, data)
+            size = getattr(item, "size", (0, 0))
+            if not size or not size[0]:
+                size = Image.open(io.BytesIO(data)).size
+        except Exception:
+            return None
+        return data, sig, changed_box(prev_sig, sig, size)
+
+    def _submit(self, data: bytes, box: Tuple[int, int, int, int]):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            pool = self._pool
+        return pool.submit(_ocr_job, self.engine, self.opts, data, box)
+
+    def submit(self, item, prev_sig: bytes = b"") -> Tuple[Optional[Future], bytes]:
+        if not self.available():
+            return None, b""
+        prepared = self._prepare(item, prev_sig)
+        if prepared is None:
+            return None, prev_sig
+        data, sig, box = prepared
+        if box is None:
+            return _resolved(""), sig
+        key = hashlib.sha1(data).hexdigest() + ":" + ",".join(str(v) for v in box)
+        hit = self._cache_get(key)
+        if hit is not None:
+            return _resolved(hit), sig
+        fut = self._submit(data, box)
+
+        def _store(f):
+            if not f.cancelled() and f.exception() is None:
+                self._cache_put(key, f.result() or "")
+
+        fut.add_done_callback(_store)
+        return fut, sig
+
+    def recognize(self, item, prev_sig: bytes = b"", timeout: Optional[float] = None) -> Tuple[Optional[str], bytes]:
+        fut, sig = self.submit(item, prev_sig)
+        if fut is None:
+            return None, sig
+        try:
+            return fut.result(timeout=timeout if timeout is not None else self.timeout) or "", sig
+        except Exception:
+            return None, sig
+
+    def extract(self, frames: Sequence) -> str:
+        if not frames or not self.available():
+            return ""
+        deadline = time.time() + self.timeout
+        texts: List[Optional[str]] = []
+        pending = {}
+        prev_sig = b""
+        for item in frames:
+            prepared = self._prepare(item, prev_sig)
+            if prepared is None:
+                continue
+            data, prev_sig, box = prepared
+            if box is None:
+                continue
+            key = hashlib.sha1(data).hexdigest() + ":" + ",".join(str(v) for v in box)
+            hit = self._cache_get(key)
+            texts.append(hit)
+            if hit is None:
+                pending[self._submit(data, box)] = (len(texts) - 1, key)
+        if pending:
+            done, not_done = wait(list(pending), timeout=max(0.0, deadline - time.time()))
+            for fut in not_done:
+                fut.cancel()
+            for fut in done:
+                idx, key = pending[fut]
+                try:
+                    text = fut.result() or ""
+                except Exception:
+                    continue
+                texts[idx] = text
+                self._cache_put(key, text)
+        return merge_text(texts, self.max_chars)
@@ -0,0 +1,59 @@
+import time
+from typing import Optional
+
+
+class AdaptivePacer:
+    def __init__(
+        self,
+        base_fps: float = 1.0,
+        min_fps: float = 0.2,
+        max_fps: float = 4.0,
+        idle_after_seconds: float = 30.0,
+        burst_seconds: float = 5.0,
+        burst_change: float = 0.2,
+        min_change: float = 0.01,
+        cpu_budget: float = 0.1,
+        disk_budget_kbps: float = 512.0,
+    ):
+        self.base_fps = base_fps
+        self.min_fps = min(min_fps, base_fps)
+        self.max_fps = max(max_fps, base_fps)
+        self.idle_after_seconds = idle_after_seconds
+        self.burst_seconds = burst_seconds
+        self.burst_change = burst_change
+        self.min_change = min_change
+        self.cpu_budget = cpu_budget
+        self.disk_budget_kbps = disk_budget_kbps
+        self._last_title: Optional[str] = None
+        self._last_activity = time.time()
+        self._burst_until = 0.0
+        self._cost = 0.0
+        self._bytes = 0.0
+        self.fps = base_fps
+
+    def _ewma(self, prev: float, value: float) -> float:
+        return value if prev <= 0 else prev * 0.8 + value * 0.2
+
+    def next_interval(self, title: Optional[str], change_score: float, cost_seconds: float, bytes_written: int = 0) -> float:
+        now = time.time()
+        switched = self._last_title is not None and (title or "") != self._last_title
+        self._last_title = title or ""
+        if switched or change_score >= self.burst_change:
+            self._burst_until = now + self.burst_seconds
+        if switched or change_score >= self.min_change:
+            self._last_activity = now
+        self._cost = self._ewma(self._cost, max(0.0, cost_seconds))
+        self._bytes = self._ewma(self._bytes, max(0, bytes_written))
+
+        if now < self._burst_until:
+            fps = self.max_fps
+        elif now - self._last_activity > self.idle_after_seconds:
+            fps = self.min_fps
+        else:
+            fps = self.base_fps
+        if self.cpu_budget > 0 and self._cost > 0:
+            fps = min(fps, self.cpu_budget / self._cost)
+        if self.disk_budget_kbps > 0 and self._bytes > 0:
+            fps = min(fps, self.disk_budget_kbps * 1024 / self._bytes)
+        self.fps = max(self.min_fps, fps)
+        return 1.0 / self.fps
\ No newline at end of file
@@ -1,15 +1,341 @@
+import os
+import json
+import time
+import random
+import threading
 import requests
 import base64
+from typing import Callable, Dict, List, Optional
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+STYLES = ["multimodal", "text_only", "images_sidecar"]
+
+
+IMAGE_MARK = "\x00collage\x00"
+_MARK_JSON = json.dumps(IMAGE_MARK)[1:-1]
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def _rejected(err: requests.HTTPError) -> bool:
+    status = err.response.status_code if err.response is not None else 0
+    return 400 <= status < 500 and status not in RETRY_STATUS
+
+
+class JsonBody:
+    def __init__(self, payload: dict, image, on_sent: Optional[Callable[[], None]] = None, chunk_size: int = 48 * 1024):
+        head, _, tail = json.dumps(payload).rpartition(_MARK_JSON)
+        self.head = head.encode("utf-8")
+        self.tail = tail.encode("utf-8")
+        self.image = memoryview(image).cast("B") if image is not None else memoryview(b"")
+        self.on_sent = on_sent
+        self.chunk_size = chunk_size - chunk_size % 3
+
+    def __len__(self) -> int:
+        return len(self.head) + 4 * ((len(self.image) + 2) // 3) + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        for i in range(0, len(self.image), self.chunk_size):
+            yield base64.b64encode(self.image[i:i + self.chunk_size])
+        yield self.tail
+        if self.on_sent is not None:
+            try:
+                self.on_sent()
+            except Exception:
+                pass
+
+
+class CardStreamParser:
+    def __init__(self):
+        self._buf = []
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._started = False
+        self._obj: Optional[List[str]] = None
+        self.text = ""
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk
+        cards = []
+        for ch in chunk:
+            if self._obj is not None:
+                self._obj.append(ch)
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if ch == '"':
+                self._in_str = self._started
+            elif ch in "[{":
+                if not self._started:
+                    if ch == "[":
+                        self._started = True
+                        self._depth = 1
+                    continue
+                self._depth += 1
+                if ch == "{" and self._depth == 2 and self._obj is None:
+                    self._obj = [ch]
+            elif ch in "]}" and self._started:
+                self._depth -= 1
+                if self._depth == 1 and self._obj is not None:
+                    try:
+                        obj = json.loads("".join(self._obj))
+                        if isinstance(obj, dict):
+                            cards.append(obj)
+                    except Exception:
+                        pass
+                    self._obj = None
+        return cards
+
+
+class CapabilityCache:
+    def __init__(self, path: str, ttl_seconds: float = 86400.0, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data: Optional[Dict] = None
+
+    def _load(self) -> Dict:
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except Exception:
+                self._data = {}
+        return self._data
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data or {}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    def get(self, base_url: str, model: str) -> Optional[str]:
+        with self._lock:
+            ent = self._load().get(f"{base_url}|{model}")
+            if not ent or self.clock() - float(ent.get("ts", 0)) > self.ttl_seconds:
+                return None
+            style = ent.get("style")
+            return style if style in STYLES else None
+
+    def put(self, base_url: str, model: str, style: str):
+        with self._lock:
+            data = self._load()
+            key = f"{base_url}|{model}"
+            ent = data.get(key)
+            if ent and ent.get("style") == style and self.clock() - float(ent.get("ts", 0)) <= self.ttl_seconds:
+                return
+            data[key] = {"style": style, "ts": self.clock()}
+            self._save()
+
+    def invalidate(self, base_url: str, model: str):
+        with self._lock:
+            if self._load().pop(f"{base_url}|{model}", None) is not None:
+                self._save()
+
+
+def make_session(pool_size: int = 4) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class OpenAICompatibleProvider:
-    def __init__(self, base_url: str, api_key: str, model: str):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        session: Optional[requests.Session] = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        backoff_max: float = 8.0,
+        deadline: float = 90.0,
+        caps: Optional[CapabilityCache] = None,
+        stream: bool = False,
+    ):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.model = model
+        self.session = session or make_session()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.caps = caps
+        self.stream = stream
+        self._stream_ok: Optional[bool] = None
+
+    def close(self):
+        self.session.close()
 
-    def summarize(self, info: dict, collage_b64: str = "", system_prompt: str = "") -> dict:
-        content = []
+    def _read_sse(self, r: requests.Response, on_delta: Callable[[str], None], deadline: float) -> dict:
+        parts = []
+        last = None
+        r.encoding = r.encoding or "utf-8"
+        for line in r.iter_lines(decode_unicode=True):
+            if time.time() > deadline:
+                raise DeadlineExceeded(r.url)
+            if not line or not line.startswith("data:"):
+                continue
+            body = line[5:].strip()
+            if body == "[DONE]":
+                break
+            try:
+                chunk = json.loads(body)
+            except Exception:
+                continue
+            last = chunk
+            choice = (chunk.get("choices") or [{}])[0]
+            delta = choice.get("delta") or choice.get("message") or {}
+            text = delta.get("content") or ""
+            if text:
+                parts.append(text)
+                on_delta(text)
+        content = "".join(parts)
+        return {
+            "id": (last or {}).get("id"),
+            "model": (last or {}).get("model"),
+            "stream": True,
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+        }
+
+    def _post(self, url: str, payload: dict, headers: dict, deadline: float, on_stream: Optional[Callable[[], Callable[[str], None]]] = None, image=None, on_sent: Optional[Callable[[], None]] = None) -> dict:
+        attempt = 0
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise DeadlineExceeded(url)
+            timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+            try:
+                streaming = bool(payload.get("stream")) and on_stream is not None
+                if image is not None:
+                    r = self.session.post(url, data=JsonBody(payload, image, on_sent), headers=headers, timeout=timeout, stream=streaming)
+                else:
+                    r = self.session.post(url, json=payload, headers=headers, timeout=timeout, stream=streaming)
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()
+                    if streaming and "text/event-stream" in (r.headers.get("Content-Type") or ""):
+                        self._stream_ok = True
+                        return self._read_sse(r, on_stream(), deadline)
+                    return r.json()
+                err: Exception = requests.HTTPError(f"{r.status_code} from {url}", response=r)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                err = e
+            if attempt >= self.retries:
+                raise err
+            delay = min(self.backoff_max, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            if time.time() + delay >= deadline:
+                raise err
+            time.sleep(delay)
+            attempt += 1
+
+    def _build_payload(self, style: str, sys_text: str, prompt: str, collage_b64: str) -> dict:
+        if style == "images_sidecar":
+            return {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": sys_text},
+                    {"role": "user", "content": prompt}
+                ],
+                "images": [{"mime_type": "image/jpeg", "data": collage_b64}],
+                "stream": self._use_stream(),
+                "max_tokens": 512,
+                "temperature": 0.6
+            }
+        content = [{"type": "text", "text": prompt}]
+        if style == "multimodal" and collage_b64:
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": "data:image/jpeg;base64," + collage_b64}
+            })
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": sys_text},
+                {"role": "user", "content": content}
+            ],
+            "stream": self._use_stream(),
+            "max_tokens": 512,
+            "temperature": 0.6
+        }
+
+    def _use_stream(self) -> bool:
+        return self.stream and self._stream_ok is not False
+
+    def _post_style(self, url: str, payload: dict, headers: dict, deadline: float, on_card: Optional[Callable[[int, dict], None]], image=None, on_sent: Optional[Callable[[], None]] = None) -> dict:
+        if image is not None and _MARK_JSON not in json.dumps(payload):
+            image = None
+        if not payload.get("stream"):
+            return self._post(url, payload, headers, deadline, image=image, on_sent=on_sent)
+
+        def _on_stream() -> Callable[[str], None]:
+            parser = CardStreamParser()
+            count = [0]
+
+            def _on_delta(text: str):
+                for card in parser.feed(text):
+                    if on_card is not None:
+                        try:
+                            on_card(count[0], card)
+                        except Exception:
+                            pass
+                    count[0] += 1
+
+            return _on_delta
+
+        try:
+            return self._post(url, payload, headers, deadline, _on_stream, image, on_sent)
+        except requests.HTTPError as e:
+            if self._stream_ok or e.response is None or e.response.status_code >= 500:
+                raise
+            data = self._post(url, dict(payload, stream=False), headers, deadline, image=image, on_sent=on_sent)
+            self._stream_ok = False
+            return data
+
+    def _style_order(self, collage_b64: str) -> List[str]:
+        styles = [s for s in STYLES if collage_b64 or s != "images_sidecar"]
+        cached = self.caps.get(self.base_url, self.model) if self.caps and collage_b64 else None
+        if cached in styles:
+            styles.remove(cached)
+            styles.insert(0, cached)
+        return styles
+
+    def summarize(
+        self,
+        info: dict,
+        collage_b64: str = "",
+        system_prompt: str = "",
+        on_card: Optional[Callable[[int, dict], None]] = None,
+        collage=None,
+        on_sent: Optional[Callable[[], None]] = None,
+    ) -> dict:
+        if collage is not None and len(collage):
+            collage_b64 = IMAGE_MARK
+        else:
+            collage = None
         text_parts = []
         titles = info.get("window_titles") or []
         if titles:
@@ -18,78 +344,44 @@ class OpenAICompatibleProvider:
         if ocr_text:
             text_parts.append("OCR keywords: " + ocr_text[:600])
         prompt = "\n\n".join(text_parts) or "Summarize recent activity based on the collage image and window titles."
-        content.append({"type": "text", "text": prompt})
-        if collage_b64:
-            content.append({
-                "type": "image_url",
-                "image_url": {"url": "data:image/jpeg;base64," + collage_b64}
-            })
         sys_text = system_prompt.strip() if system_prompt else (
             "You are an objective activity synthesizer. Produce concise, English-only outputs. "
             "Return a title (5–10 words) and a factual summary (≤2 sentences). Optionally return a timeline array with per-card entries "
             "containing startTime, endTime, category, subcategory, title, summary, detailedSummary, appSites. No distraction lists or subjective judgments."
         )
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": sys_text},
-                {"role": "user", "content": content}
-            ],
-            "stream": False,
-            "max_tokens": 512,
-            "temperature": 0.6
-        }
         headers = {
             "Authorization": f"Bearer {self.api_key}" if self.api_key else "",
             "Content-Type": "application/json"
         }
         url = self.base_url + "/chat/completions"
+        deadline = time.time() + self.deadline
+        styles = self._style_order(collage_b64)
         fallback_used = "none"
         raw_data = None
-        # primary style
-        try:
-            r = requests.post(url, json=payload, headers=headers, timeout=30)
-            r.raise_for_status()
-            data = r.json()
-            raw_data = data
-        except Exception:
-            # fallback: text-only
-            fallback_used = "text_only"
-            payload_fallback = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": sys_text},
-                    {"role": "user", "content": [{"type": "text", "text": prompt}]}
-                ],
-                "stream": False,
-                "max_tokens": 512,
-                "temperature": 0.6
-            }
+        data = None
+        last_err: Optional[Exception] = None
+        for i, style in enumerate(styles):
             try:
-                r = requests.post(url, json=payload_fallback, headers=headers, timeout=30)
-                r.raise_for_status()
-                data = r.json()
+                data = self._post_style(url, self._build_payload(style, sys_text, prompt, collage_b64), headers, deadline, on_card, collage, on_sent)
                 raw_data = data
-            except Exception:
-                # fallback 2: some implementations use images sidecar
-                fallback_used = "images_sidecar" if collage_b64 else fallback_used
-                if collage_b64:
-                    payload_images = {
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": sys_text},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "images": [{"mime_type": "image/jpeg", "data": collage_b64}],
-                        "max_tokens": 512,
-                        "temperature": 0.6
-                    }
-                    r = requests.post(url, json=payload_images, headers=headers, timeout=30)
-                    r.raise_for_status()
-                    data = r.json()
-                    raw_data = data
-                else:
-                    data = {"choices": [{"message": {"content": ""}}]}
+                fallback_used = "none" if style == "multimodal" else style
+                if self.caps and collage_b64:
+                    self.caps.put(self.base_url, self.model, style)
+                break
+            except requests.HTTPError as e:
+                if not _rejected(e):
+                    raise
+                last_err = e
+                if i == 0 and self.caps and collage_b64:
+                    self.caps.invalidate(self.base_url, self.model)
+        if data is None:
+            if collage_b64:
+                raise last_err or DeadlineExceeded(url)
+            fallback_used = "text_only"
+            data = {"choices": [{"message": {"content": ""}}]}
+        return self._parse(data, fallback_used, raw_data)
+
+    def _parse(self, data: dict, fallback_used: str, raw_data) -> dict:
         msg = (data.get("choices") or [{}])[0].get("message", {})
         txt = ""
         if isinstance(msg.get("content"), list):
@@ -98,13 +390,12 @@ class OpenAICompatibleProvider:
         else:
             txt = msg.get("content") or ""
         # try parsing as JSON array
-        import json as _json
         parsed = None
         try:
             s = txt.strip()
             if s.startswith("```"):
                 s = s.strip("`\n ")
-            parsed = _json.loads(s)
+            parsed = json.loads(s)
         except Exception:
             parsed = None
         if isinstance(parsed, list) and parsed:
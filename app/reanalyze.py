@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from app.main import (
+    load_settings,
+    build_provider,
+    load_system_prompt,
+    _normalize_title,
+    _normalize_summary,
+    _to_12h,
+    _infer_category,
+)
+from app.model import summarize_card
+from app.store import AnalysisStore, default_path
+
+
+def parse_when(value: str) -> float:
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"invalid date: {value}")
+
+
+def find_collage(data_dir: str, ts: int, record: Dict) -> str:
+    path = record.get("collage") or ""
+    if path and os.path.exists(path):
+        return path
+    path = os.path.join(data_dir, "tmp_collages", f"collage_{ts}.jpg")
+    return path if os.path.exists(path) else ""
+
+
+class Checkpoint:
+    def __init__(self, path: str, key: str, restart: bool = False):
+        self.path = path
+        self.key = key
+        self.done = set()
+        self.failed = set()
+        self._lock = threading.Lock()
+        self._dirty = 0
+        if restart:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("key") == key:
+                self.done = set(int(t) for t in data.get("done") or [])
+            else:
+                print("[reanalyze] checkpoint is for a different model or prompt, starting over")
+        except Exception:
+            pass
+
+    def mark(self, ts: int, ok: bool):
+        with self._lock:
+            if ok:
+                self.done.add(ts)
+                self.failed.discard(ts)
+            else:
+                self.failed.add(ts)
+            self._dirty += 1
+            if self._dirty >= 10:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self._dirty = 0
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "key": self.key,
+                    "done": sorted(self.done),
+                    "failed": sorted(self.failed),
+                    "updated": int(time.time()),
+                }, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+
+class Progress:
+    def __init__(self, total: int, every: float = 2.0):
+        self.total = total
+        self.every = every
+        self.ok = 0
+        self.failed = 0
+        self.started = time.time()
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, ok: bool, force: bool = False):
+        with self._lock:
+            if ok:
+                self.ok += 1
+            else:
+                self.failed += 1
+            now = time.time()
+            if not force and now - self._last < self.every and self.ok + self.failed < self.total:
+                return
+            self._last = now
+            self.report()
+
+    def report(self):
+        n = self.ok + self.failed
+        elapsed = max(1e-6, time.time() - self.started)
+        rate = n / elapsed
+        eta = (self.total - n) / rate if rate > 0 else 0
+        print(f"[reanalyze] {n}/{self.total} ok={self.ok} failed={self.failed} {rate * 60:.1f}/min eta={eta:.0f}s", flush=True)
+
+
+def build_record(ts: int, record: Dict, info: Dict, card: Dict, collage: str, provider: str, model: str) -> Dict:
+    title = _normalize_title(card.get("title"))
+    summary = _normalize_summary(card.get("summary"))
+    timeline = card.get("timeline") if isinstance(card.get("timeline"), list) else None
+    if timeline:
+        for it in timeline:
+            if isinstance(it, dict):
+                it["startTime"] = _to_12h(str(it.get("startTime", "")))
+                it["endTime"] = _to_12h(str(it.get("endTime", "")))
+    else:
+        cat, sub = _infer_category(info["window_titles"])
+        timeline = [{
+            "startTime": "",
+            "endTime": "",
+            "category": cat,
+            "subcategory": sub,
+            "title": title,
+            "summary": summary,
+            "detailedSummary": summary,
+            "appSites": {"primary": (info["window_titles"] or [""])[-1] or ""}
+        }]
+    return {
+        "time": record.get("time") or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+        "title": title,
+        "summary": summary,
+        "timeline": timeline,
+        "collage": collage,
+        "provider": provider,
+        "model": model,
+        "provider_fallback": card.get("provider_fallback") or "none",
+        "source": card.get("source") or "heuristic",
+        "window_titles": info["window_titles"],
+        "original": {
+            "title": record.get("title"),
+            "model": record.get("model"),
+            "provider": record.get("provider"),
+        },
+        "reanalyzed_at": int(time.time()),
+    }
+
+
+class Reanalyzer:
+    def __init__(self, settings, store: AnalysisStore, data_dir: str, out_dir: str, system_prompt: str, use_image: bool, max_inflight: int):
+        self.settings = settings
+        self.store = store
+        self.data_dir = data_dir
+        self.out_dir = out_dir
+        self.system_prompt = system_prompt
+        self.use_image = use_image
+        self.provider = None
+        if settings.model_type == "openai_compatible" and (settings.model_base_url or settings.model_endpoints):
+            self.provider = build_provider(settings, pool_size=max(1, max_inflight))
+        self._slots = threading.BoundedSemaphore(max(1, max_inflight))
+
+    def close(self):
+        if self.provider is not None:
+            self.provider.close()
+
+    @property
+    def model(self) -> str:
+        return self.provider.model if self.provider is not None else ""
+
+    def run_one(self, ts: int) -> bool:
+        record = self.store.get(ts) or {}
+        titles = record.get("window_titles")
+        if not isinstance(titles, list):
+            primary = ((record.get("timeline") or [{}])[0].get("appSites") or {}).get("primary")
+            titles = [primary] if primary else []
+        info = {
+            "window_titles": titles[-10:],
+            "ocr_text": record.get("ocr_text") or "",
+            "apps": [],
+            "domains": [],
+        }
+        collage = find_collage(self.data_dir, ts, record)
+        card = None
+        provider_used = "local"
+        model_used = ""
+        if self.provider is not None:
+            image = None
+            if self.use_image and collage:
+                with open(collage, "rb") as f:
+                    image = f.read()
+            with self._slots:
+                card = self.provider.summarize(info, "", self.system_prompt, collage=image)
+            provider_used = "openai_compatible"
+            model_used = card.get("model") or self.provider.model
+        if not card:
+            card = summarize_card(info)
+        obj = build_record(ts, record, info, card, collage, provider_used, model_used)
+        out = os.path.join(self.out_dir, f"analysis_{ts}.json")
+        tmp = out + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(obj, ensure_ascii=False))
+        os.replace(tmp, out)
+        return True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.reanalyze", description="re-run summarization over stored analyses")
+    parser.add_argument("--since", type=parse_when, default=0.0, help="YYYY-MM-DD[ HH:MM[:SS]], inclusive")
+    parser.add_argument("--until", type=parse_when, default=0.0, help="YYYY-MM-DD[ HH:MM[:SS]], exclusive")
+    parser.add_argument("--data-dir", default=os.path.join(os.getcwd(), "data"))
+    parser.add_argument("--out", default="", help="output directory, default data/reanalysis")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-inflight", type=int, default=0, help="concurrent model requests, default analysis.max_model_calls")
+    parser.add_argument("--model", default="", help="override model_provider.model")
+    parser.add_argument("--base-url", default="", help="override model_provider.base_url")
+    parser.add_argument("--prompt", default="", help="system prompt file, default prompt.txt")
+    parser.add_argument("--no-image", action="store_true", help="send window titles only")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    settings = load_settings()
+    if args.model:
+        settings.model_name = args.model
+    if args.base_url:
+        settings.model_base_url = args.base_url
+        settings.model_type = "openai_compatible"
+    out_dir = args.out or os.path.join(args.data_dir, "reanalysis")
+    os.makedirs(out_dir, exist_ok=True)
+    system_prompt = load_system_prompt(args.prompt)
+    use_image = settings.analysis_use_image and not args.no_image
+    inflight = args.max_inflight or settings.analysis_max_model_calls
+    workers = max(1, args.workers)
+    store = AnalysisStore(default_path(args.data_dir))
+    store.migrate_once(os.path.join(args.data_dir, "analysis"))
+    runner = Reanalyzer(settings, store, args.data_dir, out_dir, system_prompt, use_image, inflight)
+    key = hashlib.sha1(f"{runner.model}|{use_image}|{system_prompt}".encode("utf-8")).hexdigest()
+    ckpt = Checkpoint(os.path.join(out_dir, "checkpoint.json"), key, restart=args.restart)
+
+    items = [ts for ts in store.timestamps(args.since, args.until) if ts not in ckpt.done]
+    if args.limit > 0:
+        items = items[:args.limit]
+    print(f"[reanalyze] {len(items)} records to process, {len(ckpt.done)} already done, model={runner.model or 'local'} workers={workers} inflight={inflight}", flush=True)
+    if not items:
+        runner.close()
+        return 0
+    progress = Progress(len(items))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    failed: List[Tuple[int, str]] = []
+    try:
+        futures = {pool.submit(runner.run_one, ts): ts for ts in items}
+        for fut in as_completed(futures):
+            ts = futures[fut]
+            err: Optional[Exception] = None
+            try:
+                fut.result()
+            except Exception as e:
+                err = e
+            ckpt.mark(ts, err is None)
+            if err is not None:
+                failed.append((ts, str(err)))
+            progress.update(err is None)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        ckpt.save()
+        progress.report()
+        print("[reanalyze] interrupted, rerun the same command to resume")
+        return 130
+    finally:
+        runner.close()
+    pool.shutdown()
+    ckpt.save()
+    for ts, err in failed[:10]:
+        print(f"[reanalyze] failed {ts}: {err}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+
+class EndpointStats:
+    def __init__(self, name: str, alpha: float = 0.3, window: int = 50):
+        self.name = name
+        self.alpha = alpha
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.requests = 0
+        self.cooldown_until = 0.0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, seconds: float, ok: bool):
+        self.requests += 1
+        self.error_rate = self.error_rate * (1 - self.alpha) + (0.0 if ok else 1.0) * self.alpha
+        if ok:
+            self._latencies.append(seconds)
+            self.latency = seconds if self.latency <= 0 else self.latency * (1 - self.alpha) + seconds * self.alpha
+
+    def p95(self) -> float:
+        if not self._latencies:
+            return 0.0
+        s = sorted(self._latencies)
+        return s[min(len(s) - 1, int(0.95 * (len(s) - 1) + 0.5))]
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "latency_ewma": round(self.latency, 3),
+            "latency_p95": round(self.p95(), 3),
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+        }
+
+
+class CardGate:
+    def __init__(self, on_card: Callable[[int, dict], None]):
+        self.on_card = on_card
+        self.open = True
+        self._lock = threading.Lock()
+
+    def __call__(self, i: int, card: dict):
+        with self._lock:
+            if self.open:
+                self.on_card(i, card)
+
+    def close(self):
+        with self._lock:
+            self.open = False
+
+
+class EndpointRouter:
+    def __init__(
+        self,
+        providers: List,
+        hedge: bool = True,
+        hedge_min_delay: float = 2.0,
+        max_error_rate: float = 0.5,
+        cooldown_seconds: float = 60.0,
+    ):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.max_error_rate = max_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.stats = [EndpointStats(f"{p.base_url}|{p.model}") for p in providers]
+        self.model = providers[0].model if providers else ""
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(2, 2 * len(providers)))
+
+    def _ranked(self) -> List[int]:
+        now = time.time()
+        with self._lock:
+            healthy = [i for i, s in enumerate(self.stats) if s.cooldown_until <= now]
+            rest = [i for i in range(len(self.stats)) if i not in healthy]
+            healthy.sort(key=lambda i: self.stats[i].latency)
+            rest.sort(key=lambda i: self.stats[i].cooldown_until)
+        return healthy + rest
+
+    def _call(self, idx: int, info: dict, collage_b64: str, system_prompt: str, on_card: Optional[Callable], **kw) -> dict:
+        prov = self.providers[idx]
+        t0 = time.time()
+        try:
+            card = prov.summarize(info, collage_b64, system_prompt, on_card=on_card, **kw)
+            if card.get("raw_response") is None:
+                raise RuntimeError(f"no response from {prov.base_url}")
+        except Exception:
+            with self._lock:
+                st = self.stats[idx]
+                st.record(time.time() - t0, False)
+                if st.error_rate >= self.max_error_rate:
+                    st.cooldown_until = time.time() + self.cooldown_seconds
+            raise
+        with self._lock:
+            self.stats[idx].record(time.time() - t0, True)
+        card = dict(card)
+        card["model"] = prov.model
+        card["endpoint"] = prov.base_url
+        return card
+
+    def _hedge_delay(self, idx: int) -> float:
+        with self._lock:
+            return max(self.hedge_min_delay, self.stats[idx].p95())
+
+    def summarize(self, info: dict, collage_b64: str = "", system_prompt: str = "", on_card: Optional[Callable[[int, dict], None]] = None, **kw) -> dict:
+        gate = CardGate(on_card) if on_card is not None else None
+        try:
+            return self._summarize(info, collage_b64, system_prompt, gate, **kw)
+        finally:
+            if gate is not None:
+                gate.close()
+
+    def _summarize(self, info: dict, collage_b64: str, system_prompt: str, gate: Optional[CardGate], **kw) -> dict:
+        order = self._ranked()
+        if not order:
+            raise RuntimeError("no endpoints configured")
+        futures = {self._pool.submit(self._call, order[0], info, collage_b64, system_prompt, gate, **kw): order[0]}
+        queue = order[1:]
+        last_err: Optional[Exception] = None
+        hedged = False
+        while futures:
+            timeout = None
+            if self.hedge and not hedged and queue:
+                timeout = self._hedge_delay(order[0])
+            done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                with self._lock:
+                    st = self.stats[order[0]]
+                    st.latency = max(st.latency, timeout)
+                nxt = queue.pop(0)
+                futures[self._pool.submit(self._call, nxt, info, collage_b64, system_prompt, None, **kw)] = nxt
+                continue
+            for fut in done:
+                futures.pop(fut)
+                try:
+                    card = fut.result()
+                except Exception as e:
+                    last_err = e
+                    continue
+                card["hedged"] = hedged
+                return card
+            if not futures and queue:
+                nxt = queue.pop(0)
+                futures[self._pool.submit(self._call, nxt, info, collage_b64, system_prompt, None, **kw)] = nxt
+        raise last_err or RuntimeError("all endpoints failed")
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for prov in self.providers:
+            prov.close()
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [s.as_dict() for s in self.stats]
\ No newline at end of file
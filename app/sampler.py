@@ -1,27 +1,99 @@
 import os
-from typing import List, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple, Union
 from PIL import Image
+from app.change import signature
+from app.encoder import compose_tiles
+from app.framebuffer import Frame
+from app.segment import list_segment_frames
 
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+FrameRef = Union[str, Frame]
+
+
+def _open_frame(item: FrameRef) -> Image.Image:
+    if isinstance(item, Frame):
+        return item.open()
+    return Image.open(item)
 
-def list_recent_frames(root: str, max_count: int) -> List[str]:
-    if not os.path.isdir(root):
-        return []
-    files = [os.path.join(root, f) for f in os.listdir(root) if f.lower().endswith('.bmp')]
-    files.sort(key=lambda p: os.path.getmtime(p), reverse=True)
-    return list(reversed(files[:max_count]))
 
+def list_recent_frames(root: str, max_count: int, since: Optional[float] = None) -> List[Frame]:
+    return list_segment_frames(root, max_count, since)
 
-def sample_even(paths: List[str], target: int) -> List[str]:
+
+def sample_even(paths: Sequence[FrameRef], target: int) -> List[FrameRef]:
     if not paths or target <= 0:
         return []
     if len(paths) <= target:
-        return paths
+        return list(paths)
     step = len(paths) / target
     idxs = [int(i * step) for i in range(target)]
     return [paths[i] for i in idxs]
 
 
-def make_collage(paths: List[str], grid: Tuple[int, int], out_path: str, canvas_size: Tuple[int, int] = (1280, 720)) -> str:
+def _frame_sig(item: FrameRef) -> bytes:
+    sig = getattr(item, "sig", b"")
+    if sig:
+        return sig
+    try:
+        return signature(_open_frame(item).convert('RGB'))
+    except Exception:
+        return b""
+
+
+def _frame_ts(item: FrameRef, default: float) -> float:
+    ts = getattr(item, "ts", None)
+    if ts is not None:
+        return float(ts)
+    try:
+        return os.path.getmtime(item)
+    except Exception:
+        return default
+
+
+def sample_diverse(paths: Sequence[FrameRef], target: int, time_weight: float = 0.5) -> List[FrameRef]:
+    if not paths or target <= 0:
+        return []
+    if len(paths) <= target:
+        return list(paths)
+    if np is None:
+        return sample_even(paths, target)
+    sigs = [_frame_sig(p) for p in paths]
+    dim = max((len(s) for s in sigs), default=0)
+    if dim == 0:
+        return sample_even(paths, target)
+    n = len(paths)
+    feats = np.zeros((n, dim + 1), dtype=np.float32)
+    for i, s in enumerate(sigs):
+        if len(s) == dim:
+            feats[i, :dim] = np.frombuffer(s, dtype=np.uint8)
+    feats[:, :dim] /= 255.0 * np.sqrt(dim)
+    ts = np.array([_frame_ts(p, i) for i, p in enumerate(paths)], dtype=np.float64)
+    span = ts.max() - ts.min()
+    feats[:, dim] = ((ts - ts.min()) / span if span > 0 else 0.0) * time_weight
+    scores = np.array([getattr(p, "change_score", 0.0) for p in paths], dtype=np.float32)
+    first = int(np.argmax(scores)) if scores.any() else 0
+    chosen = [first]
+    dist = np.linalg.norm(feats - feats[first], axis=1)
+    for _ in range(target - 1):
+        nxt = int(np.argmax(dist + scores * 1e-3))
+        if dist[nxt] <= 0:
+            break
+        chosen.append(nxt)
+        dist = np.minimum(dist, np.linalg.norm(feats - feats[nxt], axis=1))
+    if len(chosen) < target:
+        taken = set(chosen)
+        rest = [i for i in range(n) if i not in taken]
+        chosen.extend(sample_even(rest, target - len(chosen)))
+    return [paths[i] for i in sorted(chosen)]
+
+
+def make_collage(paths: Sequence[FrameRef], grid: Tuple[int, int], out_path: str, canvas_size: Tuple[int, int] = (1280, 720)) -> str:
     if not paths:
         return ""
     rows, cols = grid
@@ -31,7 +103,7 @@ def make_collage(paths: List[str], grid: Tuple[int, int], out_path: str, canvas_
     canvas = Image.new('RGB', (w, h), color=(0, 0, 0))
     for idx, p in enumerate(paths[: rows * cols]):
         try:
-            img = Image.open(p).convert('RGB')
+            img = _open_frame(p).convert('RGB')
             img = img.resize((cell_w, cell_h))
             r = idx // cols
             c = idx % cols
@@ -40,4 +112,142 @@ def make_collage(paths: List[str], grid: Tuple[int, int], out_path: str, canvas_
             continue
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     canvas.save(out_path, format='JPEG', quality=70)
-    return out_path
\ No newline at end of file
+    return out_path
+
+
+def _fit_size(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    scale = min(box[0] / max(1, size[0]), box[1] / max(1, size[1]), 1.0)
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+
+def _load_fitted(item: FrameRef, box: Tuple[int, int]) -> Image.Image:
+    img = _open_frame(item)
+    img.draft('RGB', _fit_size(img.size, box))
+    img = img.resize(_fit_size(img.size, box), Image.BILINEAR, reducing_gap=2.0)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def load_tiles(paths: Sequence[FrameRef], box: Tuple[int, int], workers: int = 4) -> List[Image.Image]:
+    def _tile(item: FrameRef):
+        try:
+            return _load_fitted(item, box)
+        except Exception:
+            return None
+
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as pool:
+        return [t for t in pool.map(_tile, paths) if t is not None]
+
+
+def _load_tile(item: FrameRef, size: Tuple[int, int]) -> Image.Image:
+    img = _open_frame(item)
+    img.draft('RGB', size)
+    img = img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def collage_canvas(paths: Sequence[FrameRef], grid: Tuple[int, int], canvas_size: Tuple[int, int] = (1280, 720), workers: int = 4) -> Optional[Image.Image]:
+    if not paths:
+        return None
+    rows, cols = grid
+    w, h = canvas_size
+    cell_w = w // cols
+    cell_h = h // rows
+    items = list(paths[: rows * cols])
+    canvas = Image.new('RGB', (w, h), color=(0, 0, 0))
+
+    def _tile(idx: int):
+        try:
+            return idx, _load_tile(items[idx], (cell_w, cell_h))
+        except Exception:
+            return idx, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items)))) as pool:
+        for idx, img in pool.map(_tile, range(len(items))):
+            if img is None:
+                continue
+            r = idx // cols
+            c = idx % cols
+            canvas.paste(img, (c * cell_w, r * cell_h))
+    return canvas
+
+
+def make_collage_fast(paths: Sequence[FrameRef], grid: Tuple[int, int], out_path: str, canvas_size: Tuple[int, int] = (1280, 720), workers: int = 4, quality: int = 70) -> str:
+    canvas = collage_canvas(paths, grid, canvas_size, workers)
+    if canvas is None:
+        return ""
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    canvas.save(out_path, format='JPEG', quality=quality)
+    return out_path
+
+
+class _Slot:
+    __slots__ = ("ts", "tile", "change_score", "sig")
+
+    def __init__(self, ts: float, tile: Image.Image, change_score: float, sig: bytes):
+        self.ts = ts
+        self.tile = tile
+        self.change_score = change_score
+        self.sig = sig
+
+
+class IncrementalCollage:
+    def __init__(self, grid: Tuple[int, int] = (3, 4), canvas_size: Tuple[int, int] = (1280, 720), sampler: str = "even"):
+        self.grid = grid
+        self.canvas_size = canvas_size
+        self.sampler = sampler
+        rows, cols = grid
+        self.cell = (canvas_size[0] // cols, canvas_size[1] // rows)
+        self.slots = rows * cols
+        self._tiles: List[_Slot] = []
+        self._stride = 1
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def add(self, img: Image.Image, ts: float, change_score: float = 0.0, sig: bytes = b"") -> bool:
+        with self._lock:
+            self._seen += 1
+            if (self._seen - 1) % self._stride:
+                return False
+        try:
+            tile = img.resize(_fit_size(img.size, self.cell), Image.BILINEAR, reducing_gap=2.0)
+            if tile.mode != 'RGB':
+                tile = tile.convert('RGB')
+        except Exception:
+            return False
+        with self._lock:
+            self._tiles.append(_Slot(ts, tile, change_score, sig))
+            if len(self._tiles) >= 2 * self.slots:
+                if self.sampler == "diverse":
+                    pairs = zip(self._tiles[::2], self._tiles[1::2])
+                    self._tiles = [max(a, b, key=lambda t: t.change_score) for a, b in pairs]
+                else:
+                    self._tiles = self._tiles[::2]
+                self._stride *= 2
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._tiles = []
+            self._stride = 1
+            self._seen = 0
+
+    def tiles(self) -> List[Image.Image]:
+        with self._lock:
+            items = list(self._tiles)
+        if self.sampler == "diverse":
+            return [t.tile for t in sample_diverse(items, self.slots)]
+        return [t.tile for t in sample_even(items, self.slots)]
+
+    def compose(self, tiles: List[Image.Image]) -> Optional[Image.Image]:
+        if not tiles:
+            return None
+        return compose_tiles(tiles, self.grid, self.cell)
@@ -0,0 +1,270 @@
+import io
+import os
+import mmap
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+from PIL import Image
+from app.change import SIG_SIZE
+from app.framebuffer import Frame, encode_frame
+
+_REC = struct.Struct("<dQIf")
+_SIG_LEN = SIG_SIZE[0] * SIG_SIZE[1]
+REC_SIZE = _REC.size + _SIG_LEN
+
+
+class SegmentFrame(Frame):
+    __slots__ = ("path", "offset", "length")
+
+    def __init__(self, path: str, offset: int, length: int, ts: float, change_score: float, sig: bytes):
+        super().__init__(ts, (0, 0), b"", change_score, sig)
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[self.offset: self.offset + self.length]
+
+    def open(self) -> Image.Image:
+        return Image.open(io.BytesIO(self.read()))
+
+
+def _segment_starts(root: str) -> List[int]:
+    if not os.path.isdir(root):
+        return []
+    starts = []
+    for f in os.listdir(root):
+        if f.startswith("seg_") and f.endswith(".idx"):
+            try:
+                starts.append(int(f[4:-4]))
+            except ValueError:
+                continue
+    starts.sort()
+    return starts
+
+
+def _paths(root: str, start: int) -> Tuple[str, str]:
+    return os.path.join(root, f"seg_{start}.bin"), os.path.join(root, f"seg_{start}.idx")
+
+
+def read_index(root: str, start: int, max_count: int = 0) -> List[SegmentFrame]:
+    bin_path, idx_path = _paths(root, start)
+    try:
+        size = os.path.getsize(idx_path)
+    except OSError:
+        return []
+    n = size // REC_SIZE
+    if n <= 0:
+        return []
+    first = max(0, n - max_count) if max_count > 0 else 0
+    out = []
+    with open(idx_path, "rb") as f:
+        with mmap.mmap(f.fileno(), n * REC_SIZE, access=mmap.ACCESS_READ) as mm:
+            for i in range(first, n):
+                pos = i * REC_SIZE
+                ts, offset, length, score = _REC.unpack_from(mm, pos)
+                sig = mm[pos + _REC.size: pos + REC_SIZE]
+                out.append(SegmentFrame(bin_path, offset, length, ts, score, sig))
+    return out
+
+
+def list_segment_frames(root: str, max_count: int, since: Optional[float] = None) -> List[SegmentFrame]:
+    out: List[SegmentFrame] = []
+    for start in reversed(_segment_starts(root)):
+        need = max_count - len(out)
+        if need <= 0:
+            break
+        frames = read_index(root, start, need)
+        if since is not None:
+            frames = [f for f in frames if f.ts >= since]
+        out = frames + out
+        if since is not None and start / 1000.0 < since:
+            break
+    return out[-max_count:] if max_count > 0 else []
+
+
+def _last_ts(root: str, start: int) -> float:
+    last = read_index(root, start, 1)
+    return last[0].ts if last else start / 1000.0
+
+
+def _remove_segment(root: str, start: int):
+    for p in _paths(root, start):
+        try:
+            os.remove(p)
+        except Exception:
+            pass
+
+
+def prune_segments(root: str, before_ts: float) -> int:
+    starts = _segment_starts(root)
+    count = 0
+    for start in starts[:-1]:
+        if _last_ts(root, start) >= before_ts:
+            break
+        _remove_segment(root, start)
+        count += 1
+    return count
+
+
+class FrameManifest:
+    def __init__(self, root: str):
+        self.root = root
+        self._frames = deque()
+        self._segments = deque()
+        self._lock = threading.Lock()
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def load(self):
+        starts = _segment_starts(self.root)
+        frames = []
+        for start in starts:
+            frames.extend(read_index(self.root, start))
+        with self._lock:
+            self._frames = deque(frames)
+            self._segments = deque(starts)
+
+    def append(self, start: int, frame: SegmentFrame):
+        with self._lock:
+            if not self._segments or self._segments[-1] != start:
+                self._segments.append(start)
+            self._frames.append(frame)
+
+    def recent(self, max_count: int, since: Optional[float] = None) -> List[SegmentFrame]:
+        out = []
+        with self._lock:
+            for f in reversed(self._frames):
+                if len(out) >= max_count or (since is not None and f.ts < since):
+                    break
+                out.append(f)
+        out.reverse()
+        return out
+
+    def window(self, start_ts: float, end_ts: float) -> List[SegmentFrame]:
+        out = []
+        with self._lock:
+            for f in reversed(self._frames):
+                if f.ts < start_ts:
+                    break
+                if f.ts <= end_ts:
+                    out.append(f)
+        out.reverse()
+        return out
+
+    def prune(self, before_ts: float) -> int:
+        count = 0
+        with self._lock:
+            while len(self._segments) > 1:
+                start = self._segments[0]
+                bin_path, _ = _paths(self.root, start)
+                n = 0
+                last = start / 1000.0
+                for f in self._frames:
+                    if f.path != bin_path:
+                        break
+                    last = f.ts
+                    n += 1
+                if last >= before_ts:
+                    break
+                for _ in range(n):
+                    self._frames.popleft()
+                self._segments.popleft()
+                _remove_segment(self.root, start)
+                count += 1
+        return count
+
+
+class SegmentStore:
+    def __init__(self, root: str, max_width: int = 1280, quality: int = 80, queue_size: int = 32, on_frame: Optional[Callable[[SegmentFrame], object]] = None):
+        self.root = root
+        self.on_frame = on_frame
+        self.max_width = max_width
+        self.quality = quality
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._bin = None
+        self._idx = None
+        self._start = 0
+        self._offset = 0
+        self.bytes_written = 0
+        self.manifest = FrameManifest(root)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, img: Image.Image, ts: float, change_score: float = 1.0, sig: bytes = b"") -> bool:
+        try:
+            self._queue.put_nowait((img, ts, change_score, sig))
+            return True
+        except queue.Full:
+            return False
+
+    def rotate(self):
+        self._queue.put(("rotate",))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def recent(self, max_count: int, since: Optional[float] = None) -> List[SegmentFrame]:
+        return self.manifest.recent(max_count, since)
+
+    def window(self, start_ts: float, end_ts: float) -> List[SegmentFrame]:
+        return self.manifest.window(start_ts, end_ts)
+
+    def prune(self, before_ts: float) -> int:
+        return self.manifest.prune(before_ts)
+
+    def _open_segment(self):
+        self._close_segment()
+        os.makedirs(self.root, exist_ok=True)
+        self._start = int(time.time() * 1000)
+        bin_path, idx_path = _paths(self.root, self._start)
+        self._bin = open(bin_path, "ab")
+        self._idx = open(idx_path, "ab")
+        self._offset = self._bin.tell()
+
+    def _close_segment(self):
+        for f in (self._bin, self._idx):
+            try:
+                if f:
+                    f.close()
+            except Exception:
+                pass
+        self._bin = None
+        self._idx = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if item[0] == "rotate":
+                self._close_segment()
+                continue
+            img, ts, score, sig = item
+            try:
+                _, data = encode_frame(img, self.max_width, self.quality)
+                if self._bin is None:
+                    self._open_segment()
+                self._bin.write(data)
+                self._bin.flush()
+                sig = (sig or b"")[:_SIG_LEN].ljust(_SIG_LEN, b"\0")
+                self._idx.write(_REC.pack(ts, self._offset, len(data), score) + sig)
+                self._idx.flush()
+                bin_path, _ = _paths(self.root, self._start)
+                frame = SegmentFrame(bin_path, self._offset, len(data), ts, score, sig)
+                self.manifest.append(self._start, frame)
+                self._offset += len(data)
+                self.bytes_written += len(data) + REC_SIZE
+                if self.on_frame is not None:
+                    self.on_frame(frame)
+            except Exception:
+                self._close_segment()
+        self._close_segment()
\ No newline at end of file
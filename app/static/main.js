@@ -1,2 +1,54 @@
-// Placeholder for future enhancements (filters, pagination, etc.)
-console.debug('frontend loaded');
\ No newline at end of file
+(function () {
+  var grid = document.querySelector('.grid[data-live]');
+  if (!grid || !window.EventSource) return;
+
+  function el(tag, cls, text) {
+    var e = document.createElement(tag);
+    if (cls) e.className = cls;
+    if (text !== undefined) e.textContent = text;
+    return e;
+  }
+
+  function render(d, title, summary, partial) {
+    var li = el('li', 'card');
+    li.setAttribute('data-ts', d.ts);
+    var a = el('a', 'card-link');
+    a.href = '/analysis/' + d.ts;
+    a.appendChild(el('h2', 'card-title', title || ''));
+    li.appendChild(a);
+    li.appendChild(el('p', 'card-summary', summary || ''));
+    var chips = el('div', 'chips');
+    chips.appendChild(el('span', 'chip', d.time || ''));
+    if (partial) {
+      chips.appendChild(el('span', 'chip alt', 'streaming'));
+    } else {
+      chips.appendChild(el('span', 'chip', (d.provider || '') + ' / ' + (d.model || '')));
+      chips.appendChild(el('span', 'chip alt', d.source || ''));
+      if (d.provider_fallback && d.provider_fallback !== 'none') {
+        chips.appendChild(el('span', 'chip warn', 'fallback: ' + d.provider_fallback));
+      }
+    }
+    li.appendChild(chips);
+    return li;
+  }
+
+  function upsert(li) {
+    var old = grid.querySelector('li[data-ts="' + li.getAttribute('data-ts') + '"]');
+    if (old) {
+      grid.replaceChild(li, old);
+    } else {
+      grid.insertBefore(li, grid.firstChild);
+    }
+  }
+
+  var es = new EventSource('/api/events');
+  es.addEventListener('analysis', function (ev) {
+    var d = JSON.parse(ev.data);
+    upsert(render(d, d.title, d.summary, false));
+  });
+  es.addEventListener('card', function (ev) {
+    var d = JSON.parse(ev.data);
+    if (d.idx !== 0) return;
+    upsert(render(d, d.card.title, d.card.summary, true));
+  });
+})();
@@ -0,0 +1,413 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import weakref
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    ts INTEGER PRIMARY KEY,
+    time TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    summary TEXT NOT NULL DEFAULT '',
+    provider TEXT NOT NULL DEFAULT '',
+    model TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    provider_fallback TEXT NOT NULL DEFAULT '',
+    partial INTEGER NOT NULL DEFAULT 0,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    ts INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    summary TEXT NOT NULL DEFAULT '',
+    doc TEXT NOT NULL,
+    PRIMARY KEY (ts, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS raw (
+    ts INTEGER PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+    title, summary, cards, windows,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+
+FTS_WEIGHTS = (8.0, 4.0, 2.0, 1.0)
+
+LIST_COLUMNS = ("ts", "time", "title", "summary", "provider", "model", "source", "provider_fallback")
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+_RECORD = re.compile(r"^analysis_(\d+)\.json$")
+
+
+def _text(value) -> str:
+    return value if isinstance(value, str) else ("" if value is None else str(value))
+
+
+def fts_query(query: str, max_terms: int = 8) -> str:
+    terms = _TOKEN.findall(query or "")[:max_terms]
+    return " AND ".join(f'"{t}"*' for t in terms)
+
+
+def _fts_row(obj: Dict, timeline: List[Dict]) -> tuple:
+    cards = " ".join(
+        " ".join(_text(c.get(k)) for k in ("title", "summary", "detailedSummary", "category", "subcategory"))
+        for c in timeline if isinstance(c, dict)
+    )
+    titles = obj.get("window_titles") if isinstance(obj.get("window_titles"), list) else []
+    return _text(obj.get("title")), _text(obj.get("summary")), cards, " ".join(_text(t) for t in titles)
+
+
+class AnalysisStore:
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conns: List[Tuple[weakref.ref, sqlite3.Connection]] = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.fts = True
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            try:
+                conn.executescript(FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                self.fts = False
+        if self.fts:
+            self._build_fts()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._reap()
+                self._conns.append((weakref.ref(threading.current_thread()), conn))
+        return conn
+
+    def _reap(self):
+        live = []
+        for ref, conn in self._conns:
+            thread = ref()
+            if thread is not None and thread.is_alive():
+                live.append((ref, conn))
+                continue
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._conns = live
+
+    def connections(self) -> int:
+        with self._lock:
+            return len(self._conns)
+
+    def release(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._conns = [(ref, c) for ref, c in self._conns if c is not conn]
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for _, conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    def _put(self, conn: sqlite3.Connection, ts: int, obj: Dict, raw=None, replace: bool = True):
+        timeline = obj.get("timeline") if isinstance(obj.get("timeline"), list) else []
+        doc = {k: v for k, v in obj.items() if k != "timeline"}
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        cur = conn.execute(
+            f"{verb} INTO analyses (ts, time, title, summary, provider, model, source, provider_fallback, partial, doc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                ts,
+                _text(obj.get("time")),
+                _text(obj.get("title")),
+                _text(obj.get("summary")),
+                _text(obj.get("provider")),
+                _text(obj.get("model")),
+                _text(obj.get("source")),
+                _text(obj.get("provider_fallback")),
+                1 if obj.get("partial") else 0,
+                json.dumps(doc, ensure_ascii=False),
+            ),
+        )
+        if not replace and cur.rowcount == 0:
+            return False
+        conn.execute("DELETE FROM cards WHERE ts = ?", (ts,))
+        conn.executemany(
+            "INSERT INTO cards (ts, idx, category, title, summary, doc) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (ts, i, _text(c.get("category")), _text(c.get("title")), _text(c.get("summary")), json.dumps(c, ensure_ascii=False))
+                for i, c in enumerate(timeline) if isinstance(c, dict)
+            ],
+        )
+        if self.fts:
+            conn.execute("DELETE FROM analyses_fts WHERE rowid = ?", (ts,))
+            conn.execute(
+                "INSERT INTO analyses_fts (rowid, title, summary, cards, windows) VALUES (?, ?, ?, ?, ?)",
+                (ts,) + _fts_row(obj, timeline),
+            )
+        if raw is not None:
+            conn.execute("INSERT OR REPLACE INTO raw (ts, doc) VALUES (?, ?)", (ts, json.dumps(raw, ensure_ascii=False)))
+        return True
+
+    def put(self, ts: int, obj: Dict, raw=None):
+        conn = self._conn()
+        with conn:
+            self._put(conn, int(ts), obj, raw)
+            self._event(conn, int(ts), obj)
+
+    def _event(self, conn: sqlite3.Connection, ts: int, obj: Dict):
+        timeline = obj.get("timeline") if isinstance(obj.get("timeline"), list) else []
+        if obj.get("partial"):
+            if not timeline:
+                return
+            kind = "card"
+            data = {"ts": str(ts), "time": _text(obj.get("time")), "idx": len(timeline) - 1, "card": timeline[-1]}
+        else:
+            kind = "analysis"
+            data = {c: _text(obj.get(c)) for c in LIST_COLUMNS if c != "ts"}
+            data.update(ts=str(ts), cards=len(timeline))
+        conn.execute(
+            "INSERT INTO events (ts, kind, created, data) VALUES (?, ?, ?, ?)",
+            (ts, kind, time.time(), json.dumps(data, ensure_ascii=False)),
+        )
+
+    def events_since(self, after_id: int, limit: int = 500) -> List[tuple]:
+        return self._conn().execute(
+            "SELECT id, kind, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (int(after_id), limit)
+        ).fetchall()
+
+    def last_event_id(self) -> int:
+        row = self._conn().execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def get(self, ts: int) -> Optional[Dict]:
+        conn = self._conn()
+        row = conn.execute("SELECT doc FROM analyses WHERE ts = ?", (int(ts),)).fetchone()
+        if row is None:
+            return None
+        obj = json.loads(row[0])
+        obj["timeline"] = self.cards(ts)
+        return obj
+
+    def cards(self, ts: int) -> List[Dict]:
+        rows = self._conn().execute("SELECT doc FROM cards WHERE ts = ? ORDER BY idx", (int(ts),)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def raw(self, ts: int):
+        row = self._conn().execute("SELECT doc FROM raw WHERE ts = ?", (int(ts),)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def list(self, limit: int = 50, offset: int = 0, before: Optional[int] = None, after: Optional[int] = None) -> List[Dict]:
+        sql = f"SELECT {', '.join(LIST_COLUMNS)} FROM analyses"
+        if after is not None:
+            rows = self._conn().execute(sql + " WHERE ts > ? ORDER BY ts ASC LIMIT ?", (int(after), limit)).fetchall()
+            rows.reverse()
+        elif before is not None:
+            rows = self._conn().execute(sql + " WHERE ts < ? ORDER BY ts DESC LIMIT ?", (int(before), limit)).fetchall()
+        else:
+            rows = self._conn().execute(sql + " ORDER BY ts DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [dict(zip(LIST_COLUMNS, r), ts=str(r[0])) for r in rows]
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[List[Dict], int]:
+        conn = self._conn()
+        cols = ", ".join(f"a.{c}" for c in LIST_COLUMNS)
+        if self.fts:
+            match = fts_query(query)
+            if not match:
+                return [], 0
+            weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+            total = conn.execute("SELECT COUNT(*) FROM analyses_fts WHERE analyses_fts MATCH ?", (match,)).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {cols}, f.rank FROM ("
+                f"SELECT rowid, bm25(analyses_fts, {weights}) AS rank FROM analyses_fts "
+                "WHERE analyses_fts MATCH ? ORDER BY rank, rowid DESC LIMIT ? OFFSET ?"
+                ") f JOIN analyses a ON a.ts = f.rowid ORDER BY f.rank, a.ts DESC",
+                (match, limit, offset),
+            ).fetchall()
+        else:
+            where = "instr(lower(a.title || ' ' || a.summary), ?) > 0"
+            needle = (query or "").lower()
+            total = conn.execute(f"SELECT COUNT(*) FROM analyses a WHERE {where}", (needle,)).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {cols}, 0 FROM analyses a WHERE {where} ORDER BY a.ts DESC LIMIT ? OFFSET ?",
+                (needle, limit, offset),
+            ).fetchall()
+        items = [dict(zip(LIST_COLUMNS, r), ts=str(r[0]), rank=round(-r[-1], 3)) for r in rows]
+        return items, total
+
+    def _build_fts(self, batch: int = 2000):
+        if self.get_meta("fts_built"):
+            return
+        conn = self._conn()
+        last = -1
+        while True:
+            rows = conn.execute("SELECT ts, doc FROM analyses WHERE ts > ? ORDER BY ts LIMIT ?", (last, batch)).fetchall()
+            if not rows:
+                break
+            with conn:
+                for ts, doc in rows:
+                    obj = json.loads(doc)
+                    conn.execute("DELETE FROM analyses_fts WHERE rowid = ?", (ts,))
+                    conn.execute(
+                        "INSERT INTO analyses_fts (rowid, title, summary, cards, windows) VALUES (?, ?, ?, ?, ?)",
+                        (ts,) + _fts_row(obj, self.cards(ts)),
+                    )
+            last = rows[-1][0]
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_built', '1')")
+
+    def timestamps(self, since: float = 0, until: float = 0) -> List[int]:
+        sql = "SELECT ts FROM analyses WHERE ts >= ? AND partial = 0"
+        args: list = [int(since)]
+        if until:
+            sql += " AND ts < ?"
+            args.append(int(until))
+        return [r[0] for r in self._conn().execute(sql + " ORDER BY ts", args)]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def prune(self, before_ts: float) -> int:
+        conn = self._conn()
+        with conn:
+            n = conn.execute("DELETE FROM analyses WHERE ts < ?", (int(before_ts),)).rowcount
+            conn.execute("DELETE FROM cards WHERE ts < ?", (int(before_ts),))
+            conn.execute("DELETE FROM raw WHERE ts < ?", (int(before_ts),))
+            if self.fts:
+                conn.execute("DELETE FROM analyses_fts WHERE rowid < ?", (int(before_ts),))
+            conn.execute("DELETE FROM events WHERE ts < ? OR id <= (SELECT MAX(id) FROM events) - 10000", (int(before_ts),))
+        return n
+
+    def signature(self) -> tuple:
+        sig = []
+        for p in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(p)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def import_json(self, analysis_dir: str, batch: int = 500) -> int:
+        try:
+            names = sorted(n for n in os.listdir(analysis_dir) if _RECORD.match(n))
+        except Exception:
+            return 0
+        conn = self._conn()
+        imported = 0
+        for i in range(0, len(names), batch):
+            with conn:
+                for name in names[i:i + batch]:
+                    ts = int(_RECORD.match(name).group(1))
+                    obj = _load_json(os.path.join(analysis_dir, name))
+                    if not isinstance(obj, dict):
+                        continue
+                    if not isinstance(obj.get("timeline"), list) or not obj["timeline"]:
+                        obj["timeline"] = _load_parts(analysis_dir, ts)
+                    raw = _load_json(os.path.join(analysis_dir, f"raw_{ts}.json"))
+                    if self._put(conn, ts, obj, raw, replace=False):
+                        imported += 1
+        return imported
+
+    def migrate_once(self, analysis_dir: str) -> int:
+        if self.get_meta("json_imported"):
+            return 0
+        n = self.import_json(analysis_dir)
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', '1')")
+        if n:
+            print(f"[store] imported {n} analyses from {analysis_dir}")
+        return n
+
+
+def _load_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _load_parts(analysis_dir: str, ts: int) -> List[Dict]:
+    idx = _load_json(os.path.join(analysis_dir, f"analysis_{ts}_index.json")) or {}
+    paths: Iterable = idx.get("parts") if isinstance(idx.get("parts"), list) else []
+    parts = []
+    for p in paths:
+        obj = _load_json(os.path.join(analysis_dir, os.path.basename(str(p))))
+        if isinstance(obj, dict) and isinstance(obj.get("card"), dict):
+            parts.append(obj["card"])
+    return parts
+
+
+def default_path(data_dir: str) -> str:
+    return os.path.join(data_dir, "analyses.db")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="import analysis JSON files into the store")
+    p.add_argument("--data-dir", default=os.path.join(os.getcwd(), "data"))
+    p = sub.add_parser("stats", help="print store size")
+    p.add_argument("--data-dir", default=os.path.join(os.getcwd(), "data"))
+    args = parser.parse_args(argv)
+    store = AnalysisStore(default_path(args.data_dir))
+    if args.cmd == "import":
+        n = store.import_json(os.path.join(args.data_dir, "analysis"))
+        print(f"[store] imported {n} analyses")
+    else:
+        print(f"[store] {store.count()} analyses in {store.path}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,68 @@ import os
 import sys
 import re
 import json
-from typing import List, Dict, Optional
-from flask import Flask, jsonify, render_template, send_from_directory, request, abort
+import gzip
+import time
+import hashlib
+import threading
+from collections import deque
+from typing import Dict, Optional
+from flask import Flask, Response, jsonify, render_template, send_from_directory, request, abort
+from app.store import AnalysisStore, default_path
+from app.cache import LruCache
+
+
+class EventHub:
+    def __init__(self, store: AnalysisStore, poll_seconds: float = 0.5, backlog: int = 1000):
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.clients = 0
+        self.last_id = store.last_event_id()
+        self._events: deque = deque(maxlen=backlog)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        sig = None
+        while True:
+            with self._cond:
+                idle = self.clients == 0
+            time.sleep(self.poll_seconds * (10 if idle else 1))
+            try:
+                cur = self.store.signature()
+                if cur == sig:
+                    continue
+                rows = self.store.events_since(self.last_id)
+                while rows:
+                    with self._cond:
+                        self._events.extend(rows)
+                        self.last_id = rows[-1][0]
+                        self._cond.notify_all()
+                    rows = self.store.events_since(self.last_id) if len(rows) >= 500 else []
+                sig = cur
+            except Exception as e:
+                print(f"[events] poll failed: {e}")
+
+    def subscribe(self):
+        with self._cond:
+            self.clients += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self):
+        with self._cond:
+            self.clients -= 1
+
+    def wait(self, after_id: int, timeout: float) -> list:
+        with self._cond:
+            if self.last_id <= after_id:
+                self._cond.wait(timeout)
+            if self.last_id <= after_id:
+                return []
+            if self._events and self._events[0][0] <= after_id + 1:
+                return [e for e in self._events if e[0] > after_id]
+        return self.store.events_since(after_id)
 
 
 def create_app() -> Flask:
@@ -19,17 +79,28 @@ def create_app() -> Flask:
         static_folder=os.path.join(base_dir, "app", "static")
     )
     app.config["MAX_CONTENT_LENGTH"] = 2 * 1024 * 1024
+    store = AnalysisStore(default_path(data_dir))
+    store.migrate_once(analysis_dir)
+    app.config["STORE"] = store
+
+    def _safe_ts(ts: str) -> Optional[str]:
+        if re.fullmatch(r"\d{1,18}", ts or ""):
+            return ts
+        return None
+
+    @app.teardown_appcontext
+    def _release_store(exc):
+        store.release()
 
-    def _list_main_files() -> List[str]:
-        if not os.path.isdir(analysis_dir):
-            return []
-        files = []
-        for f in os.listdir(analysis_dir):
-            m = re.fullmatch(r"analysis_(\d+)\.json", f)
-            if m:
-                files.append(f)
-        files.sort(key=lambda n: int(re.findall(r"\d+", n)[0]), reverse=True)
-        return files
+    @app.after_request
+    def _secure_headers(resp):
+        resp.headers["X-Content-Type-Options"] = "nosniff"
+        resp.headers["X-Frame-Options"] = "DENY"
+        resp.headers["Referrer-Policy"] = "no-referrer"
+        resp.headers["Content-Security-Policy"] = "default-src 'self'; img-src 'self' data:; style-src 'self'; script-src 'self'"
+        if app.config.get("USE_SSL"):
+            resp.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        return resp
 
     def _load_json(path: str) -> Optional[Dict]:
         try:
@@ -38,11 +109,72 @@ def create_app() -> Flask:
         except Exception:
             return None
 
-    def _file_for_ts(ts: str) -> str:
-        return os.path.join(analysis_dir, f"analysis_{ts}.json")
+    web_cfg = (_load_json(settings_path) or {}).get("web") or {}
+    cache = LruCache(
+        max_entries=max(16, int(web_cfg.get("cache_max_entries", 2048))),
+        max_bytes=max(1, int(web_cfg.get("cache_max_mb", 32))) * 1024 * 1024,
+    )
+    gzip_min_bytes = max(0, int(web_cfg.get("gzip_min_bytes", 1024)))
+    cache_state = {"sig": None}
+    app.config["CACHE"] = cache
+
+    def _json_size(value) -> int:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+
+    def _cached(key, loader, sizeof=_json_size):
+        sig = store.signature()
+        if sig != cache_state["sig"]:
+            cache.clear()
+            cache_state["sig"] = sig
+        value = cache.get((sig, key))
+        if value is None:
+            value = loader()
+            if value is not None:
+                cache.put((sig, key), value, sizeof(value))
+        return value
+
+    def _encode(obj) -> Optional[tuple]:
+        if obj is None:
+            return None
+        body = app.json.dumps(obj).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()[:32]
+        gz = gzip.compress(body, compresslevel=6) if gzip_min_bytes and len(body) >= gzip_min_bytes else None
+        return body, etag, gz
+
+    def _accepts_gzip(header: str) -> bool:
+        quality = {}
+        for part in header.lower().split(","):
+            coding, _, params = part.partition(";")
+            m = re.search(r"q\s*=\s*([0-9.]+)", params)
+            try:
+                quality[coding.strip()] = float(m.group(1)) if m else 1.0
+            except Exception:
+                quality[coding.strip()] = 0.0
+        return quality.get("gzip", quality.get("x-gzip", quality.get("*", 0.0))) > 0
+
+    def _json_response(key, loader) -> Response:
+        ent = _cached(("json",) + key, lambda: _encode(loader()), sizeof=lambda e: len(e[0]) + len(e[2] or b""))
+        if ent is None:
+            abort(404)
+        body, etag, gz = ent
+        use_gz = gz is not None and _accepts_gzip(request.headers.get("Accept-Encoding") or "")
+        tag = f'"{etag}-gz"' if use_gz else f'"{etag}"'
+        match = [t.strip() for t in (request.headers.get("If-None-Match") or "").split(",")]
+        headers = {"ETag": tag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if "*" in match or tag in match:
+            return Response(status=304, headers=headers)
+        resp = Response(gz if use_gz else body, mimetype="application/json", headers=headers)
+        if use_gz:
+            resp.headers["Content-Encoding"] = "gzip"
+        return resp
 
-    def _index_for_ts(ts: str) -> str:
-        return os.path.join(analysis_dir, f"analysis_{ts}_index.json")
+    def _int_arg(name: str) -> Optional[int]:
+        v = request.args.get(name)
+        if v is None or v == "":
+            return None
+        if not re.fullmatch(r"\d{1,18}", v):
+            abort(400)
+        return int(v)
 
     def _load_settings() -> Dict:
         obj = _load_json(settings_path) or {}
@@ -106,50 +238,20 @@ def create_app() -> Flask:
             offset = 0
         limit = max(1, min(200, limit))
         offset = max(0, min(10000, offset))
-        files = _list_main_files()
-        items = []
-        for f in files[offset: offset + limit]:
-            obj = _load_json(os.path.join(analysis_dir, f)) or {}
-            title = obj.get("title") or ""
-            summary = obj.get("summary") or ""
-            meta = {
-                "ts": re.findall(r"\d+", f)[0],
-                "time": obj.get("time") or "",
-                "title": title,
-                "summary": summary,
-                "provider": obj.get("provider") or "",
-                "model": obj.get("model") or "",
-                "source": obj.get("source") or "",
-                "provider_fallback": obj.get("provider_fallback") or "",
-            }
-            txt = (title + " " + summary).lower()
-            if query and query not in txt:
-                continue
-            items.append(meta)
+        if query:
+            items, _ = _cached(("search", query, limit, offset), lambda: store.search(query, limit, offset))
+        else:
+            items = _cached(("list", limit, offset), lambda: store.list(limit, offset))
         return render_template("index.html", items=items)
 
     @app.get("/analysis/<ts>")
     def detail(ts: str):
         if not _safe_ts(ts):
             abort(400)
-        p = _file_for_ts(ts)
-        obj = _load_json(p)
+        obj = _cached(("analysis", ts), lambda: store.get(int(ts)))
         if not obj:
             abort(404)
-        idx = _load_json(_index_for_ts(ts))
-        parts = []
-        if idx and isinstance(idx.get("parts"), list):
-            for part_path in idx["parts"]:
-                try:
-                    name = os.path.basename(part_path)
-                    part_obj = _load_json(os.path.join(analysis_dir, name))
-                    if part_obj:
-                        parts.append(part_obj.get("card") or {})
-                except Exception:
-                    continue
-        timeline = obj.get("timeline") if isinstance(obj.get("timeline"), list) else []
-        if not timeline and parts:
-            timeline = parts
+        timeline = obj.get("timeline") or []
         collage_name = ""
         try:
             collage_name = os.path.basename(obj.get("collage") or "")
@@ -172,56 +274,82 @@ def create_app() -> Flask:
             limit = 50
         offset = max(0, min(10000, offset))
         limit = max(1, min(200, limit))
-        files = _list_main_files()[offset: offset + limit]
-        out = []
-        for f in files:
-            obj = _load_json(os.path.join(analysis_dir, f)) or {}
-            meta = {
-                "ts": re.findall(r"\d+", f)[0],
-                "time": obj.get("time") or "",
-                "title": obj.get("title") or "",
-                "summary": obj.get("summary") or "",
-                "provider": obj.get("provider") or "",
-                "model": obj.get("model") or "",
-                "source": obj.get("source") or "",
-                "provider_fallback": obj.get("provider_fallback") or "",
-            }
-            txt = (meta["title"] + " " + meta["summary"]).lower()
-            if query and query not in txt:
-                continue
-            out.append(meta)
-        return jsonify({"items": out, "offset": offset, "limit": limit})
+        before = _int_arg("before")
+        after = _int_arg("after")
+        if before is not None and after is not None:
+            abort(400)
+        if query:
+            def _search():
+                out, total = store.search(query, limit, offset)
+                return {"items": out, "offset": offset, "limit": limit, "total": total}
+
+            return _json_response(("search", query, limit, offset), _search)
+
+        def _page():
+            out = store.list(limit, offset, before=before, after=after)
+            page = {"items": out, "limit": limit}
+            if before is None and after is None:
+                page["offset"] = offset
+            page["next_before"] = out[-1]["ts"] if len(out) == limit else None
+            page["prev_after"] = out[0]["ts"] if out else after
+            return page
+
+        return _json_response(("list", limit, offset, before, after), _page)
 
     @app.get("/api/analysis/<ts>")
     def api_analysis(ts: str):
         if not _safe_ts(ts):
             abort(400)
-        p = _file_for_ts(ts)
-        obj = _load_json(p)
-        if not obj:
-            abort(404)
-        return jsonify(obj)
+        return _json_response(("analysis", ts), lambda: store.get(int(ts)))
 
     @app.get("/api/index/<ts>")
     def api_index(ts: str):
         if not _safe_ts(ts):
             abort(400)
-        idx = _load_json(_index_for_ts(ts))
-        if not idx:
-            abort(404)
-        return jsonify(idx)
+        def _index():
+            parts = store.cards(int(ts))
+            return {"ts": ts, "parts": parts} if parts else None
+
+        return _json_response(("cards", ts), _index)
 
     @app.get("/api/raw/<ts>")
     def api_raw(ts: str):
         if not _safe_ts(ts):
             abort(400)
-        raw_path = os.path.join(analysis_dir, f"raw_{ts}.json")
-        if not os.path.isfile(raw_path):
-            abort(404)
-        obj = _load_json(raw_path)
-        if obj is None:
-            abort(404)
-        return jsonify(obj)
+        return _json_response(("raw", ts), lambda: store.raw(int(ts)))
+
+    hub = EventHub(store)
+    app.config["EVENTS"] = hub
+
+    @app.get("/api/events")
+    def api_events():
+        last = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or ""
+        after_id = int(last) if re.fullmatch(r"\d{1,18}", last) else hub.last_id
+
+        def _stream(after_id: int):
+            hub.subscribe()
+            try:
+                yield "retry: 3000\n\n"
+                while True:
+                    events = hub.wait(after_id, 15.0)
+                    if not events:
+                        yield ": keepalive\n\n"
+                        continue
+                    for eid, kind, data in events:
+                        yield f"id: {eid}\nevent: {kind}\ndata: {data}\n\n"
+                        after_id = eid
+            finally:
+                hub.unsubscribe()
+                store.release()
+
+        return Response(_stream(after_id), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+
+    @app.get("/api/cache")
+    def api_cache():
+        return jsonify(cache.stats())
 
     @app.get("/settings")
     def settings_page():
@@ -298,14 +426,18 @@ def create_app() -> Flask:
         n = (name or "").lower()
         if not (n.endswith(".jpg") or n.endswith(".jpeg")):
             abort(400)
-        return send_from_directory(collages_dir, name, cache_timeout=86400)
+        return send_from_directory(collages_dir, name, max_age=86400)
 
     @app.get("/analysis_files/<path:name>")
     def analysis_files(name: str):
-        n = (name or "").lower()
-        if not n.endswith(".json"):
+        m = re.fullmatch(r"(analysis|raw)_(\d{1,18})(_index)?\.json", name or "")
+        if not m or (m.group(1) == "raw" and m.group(3)):
             abort(400)
-        return send_from_directory(analysis_dir, name, cache_timeout=86400)
+        if m.group(1) == "raw":
+            return api_raw(m.group(2))
+        if m.group(3):
+            return api_index(m.group(2))
+        return api_analysis(m.group(2))
 
     return app
 
@@ -327,17 +459,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-    def _safe_ts(ts: str) -> Optional[str]:
-        if re.fullmatch(r"\d+", ts or ""):
-            return ts
-        return None
-
-    @app.after_request
-    def _secure_headers(resp):
-        resp.headers["X-Content-Type-Options"] = "nosniff"
-        resp.headers["X-Frame-Options"] = "DENY"
-        resp.headers["Referrer-Policy"] = "no-referrer"
-        resp.headers["Content-Security-Policy"] = "default-src 'self'; img-src 'self' data:; style-src 'self'; script-src 'self'"
-        if app.config.get("USE_SSL"):
-            resp.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        return resp
\ No newline at end of file
@@ -0,0 +1,115 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from app.mockserver import MockServer
+
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "[]"}}]}
+
+
+class StubServer:
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = 0
+        self.connections = 0
+        self.bodies = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                with server._lock:
+                    server.requests += 1
+                    server.bodies.append(body)
+                    n = server.requests
+                server.respond(self, body, n)
+
+        return Handler
+
+
+def send_json(handler, status: int, obj):
+    data = json.dumps(obj).encode()
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+def send_sse(handler, content: str, chunks: int = 8, stall_after: int = -1, stall: float = 0.0):
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/event-stream")
+    handler.send_header("Connection", "close")
+    handler.end_headers()
+    step = max(1, len(content) // chunks)
+    try:
+        for n, i in enumerate(range(0, len(content), step)):
+            if n == stall_after:
+                handler.wfile.flush()
+                time.sleep(stall)
+                return
+            chunk = {"choices": [{"delta": {"content": content[i:i + step]}}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+    except OSError:
+        pass
+    finally:
+        handler.close_connection = True
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def _start(respond):
+        server = StubServer(respond)
+        servers.append(server)
+        return server
+
+    yield _start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def _start(**kw):
+        kw.setdefault("latency", 0.0)
+        kw.setdefault("jitter", 0.0)
+        kw.setdefault("chunk_delay", 0.0)
+        server = MockServer(**kw).start()
+        servers.append(server)
+        return server
+
+    yield _start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,97 @@
+import time
+import pytest
+import requests
+from tests.conftest import COMPLETION, send_json
+from app.provider import OpenAICompatibleProvider, CapabilityCache, DeadlineExceeded
+
+INFO = {"window_titles": ["editor - main.py"], "ocr_text": ""}
+COLLAGE = b"\xff\xd8 not really a jpeg \xff\xd9"
+
+
+def make_provider(url: str, **kw) -> OpenAICompatibleProvider:
+    kw.setdefault("retries", 0)
+    kw.setdefault("stream", False)
+    return OpenAICompatibleProvider(url, "", "mock-model", **kw)
+
+
+def test_session_reuses_connection(stub_server):
+    server = stub_server(lambda h, body, n: send_json(h, 200, COMPLETION))
+    prov = make_provider(server.url)
+    for _ in range(5):
+        card = prov.summarize(INFO)
+        assert card["raw_response"] is not None
+    assert server.requests == 5
+    assert server.connections == 1
+
+
+def test_retries_with_backoff_then_raises(stub_server):
+    server = stub_server(lambda h, body, n: send_json(h, 503, {"error": "busy"}))
+    prov = make_provider(server.url, retries=2, backoff=0.1, backoff_max=1.0)
+    t0 = time.time()
+    with pytest.raises(requests.HTTPError):
+        prov._post(server.url + "/chat/completions", {"model": "m", "messages": []}, {}, time.time() + 10)
+    elapsed = time.time() - t0
+    assert server.requests == 3
+    assert 0.15 <= elapsed < 2.0
+
+
+def test_retry_recovers_after_transient_error(stub_server):
+    server = stub_server(lambda h, body, n: send_json(h, 503 if n <= 2 else 200, COMPLETION))
+    prov = make_provider(server.url, retries=3, backoff=0.01)
+    data = prov._post(server.url + "/chat/completions", {"model": "m", "messages": []}, {}, time.time() + 10)
+    assert data["choices"]
+    assert server.requests == 3
+
+
+def test_client_error_is_not_retried(stub_server):
+    server = stub_server(lambda h, body, n: send_json(h, 400, {"error": "bad"}))
+    prov = make_provider(server.url, retries=3, backoff=0.01)
+    with pytest.raises(requests.HTTPError):
+        prov._post(server.url + "/chat/completions", {"model": "m", "messages": []}, {}, time.time() + 10)
+    assert server.requests == 1
+
+
+def test_deadline_bounds_slow_endpoint(stub_server):
+    server = stub_server(lambda h, body, n: (time.sleep(1.0), send_json(h, 200, COMPLETION)))
+    prov = make_provider(server.url, retries=3, backoff=0.05)
+    t0 = time.time()
+    with pytest.raises((DeadlineExceeded, requests.Timeout)):
+        prov._post(server.url + "/chat/completions", {"model": "m", "messages": []}, {}, time.time() + 0.3)
+    assert time.time() - t0 < 0.8
+
+
+def test_server_error_keeps_multimodal_style(mock_server, tmp_path):
+    server = mock_server(error_rate=1.0)
+    caps = CapabilityCache(str(tmp_path / "caps.json"))
+    prov = make_provider(server.url, caps=caps)
+    with pytest.raises(requests.HTTPError):
+        prov.summarize(INFO, collage=COLLAGE)
+    assert server.stats()["styles"] == {"multimodal": 1}
+    assert caps.get(server.url, "mock-model") is None
+    server.error_rate = 0.0
+    card = prov.summarize(INFO, collage=COLLAGE)
+    assert card["provider_fallback"] == "none"
+    assert server.stats()["styles"] == {"multimodal": 2}
+    assert caps.get(server.url, "mock-model") == "multimodal"
+
+
+def test_rejected_style_falls_back_and_is_cached(mock_server, tmp_path):
+    server = mock_server(reject_styles=["multimodal"])
+    caps = CapabilityCache(str(tmp_path / "caps.json"))
+    prov = make_provider(server.url, caps=caps)
+    card = prov.summarize(INFO, collage=COLLAGE)
+    assert card["provider_fallback"] == "text_only"
+    assert caps.get(server.url, "mock-model") == "text_only"
+    prov.summarize(INFO, collage=COLLAGE)
+    assert server.stats()["styles"] == {"multimodal": 1, "text_only": 2}
+
+
+def test_cached_style_expires(tmp_path):
+    now = [1000.0]
+    caps = CapabilityCache(str(tmp_path / "caps.json"), ttl_seconds=100, clock=lambda: now[0])
+    caps.put("http://x", "m", "text_only")
+    now[0] += 60
+    caps.put("http://x", "m", "text_only")
+    assert caps.get("http://x", "m") == "text_only"
+    now[0] += 50
+    assert caps.get("http://x", "m") is None
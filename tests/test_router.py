@@ -0,0 +1,72 @@
+import time
+import threading
+from app.provider import OpenAICompatibleProvider
+from app.router import EndpointRouter
+
+INFO = {"window_titles": ["editor - main.py"], "ocr_text": ""}
+
+
+def make_router(*servers, stream=(), **kw) -> EndpointRouter:
+    providers = [
+        OpenAICompatibleProvider(s.url, "", f"model-{i}", retries=0, stream=s in stream)
+        for i, s in enumerate(servers)
+    ]
+    kw.setdefault("hedge_min_delay", 0.1)
+    return EndpointRouter(providers, **kw)
+
+
+def test_fast_primary_is_not_hedged(mock_server):
+    fast = mock_server(stream=False)
+    backup = mock_server(stream=False)
+    router = make_router(fast, backup)
+    card = router.summarize(INFO)
+    assert card["endpoint"] == fast.url
+    assert card["hedged"] is False
+    assert backup.stats()["requests"] == 0
+
+
+def test_slow_primary_is_hedged(mock_server):
+    slow = mock_server(latency=0.6, stream=False)
+    fast = mock_server(stream=False)
+    router = make_router(slow, fast)
+    t0 = time.time()
+    card = router.summarize(INFO)
+    assert time.time() - t0 < 0.5
+    assert card["endpoint"] == fast.url
+    assert card["hedged"] is True
+    assert router._ranked()[0] == 1
+
+
+def test_failed_primary_falls_over(mock_server):
+    broken = mock_server(error_rate=1.0)
+    good = mock_server(stream=False)
+    router = make_router(broken, good, hedge=False)
+    card = router.summarize(INFO)
+    assert card["endpoint"] == good.url
+    assert router.snapshot()[0]["error_rate"] > 0
+
+
+def test_losing_stream_stops_delivering_cards(mock_server):
+    slow = mock_server(latency=0.3, stream=True, chunk_delay=0.03)
+    fast = mock_server(stream=False)
+    router = make_router(slow, fast, stream=(slow,))
+    calls = []
+    returned = threading.Event()
+
+    def on_card(i, card):
+        calls.append(returned.is_set())
+
+    card = router.summarize(INFO, on_card=on_card)
+    returned.set()
+    assert card["endpoint"] == fast.url
+    assert card["hedged"] is True
+    assert slow.wait_completed(1, timeout=5)
+    assert True not in calls
+    router.close()
+
+
+def test_close_shuts_down_pool(mock_server):
+    router = make_router(mock_server(stream=False))
+    router.summarize(INFO)
+    router.close()
+    assert router._pool._shutdown
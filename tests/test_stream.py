@@ -0,0 +1,78 @@
+import json
+from app.provider import OpenAICompatibleProvider, CardStreamParser
+from tests.conftest import send_json, send_sse
+
+INFO = {"window_titles": ["editor - main.py"], "ocr_text": ""}
+CARDS = [
+    {"startTime": f"09:{i * 5:02d}", "endTime": f"09:{i * 5 + 5:02d}", "title": f"Card {i}", "summary": f"Summary {i}. " * 20}
+    for i in range(3)
+]
+CONTENT = json.dumps(CARDS)
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": CONTENT}}]}
+
+
+def make_provider(url: str, **kw) -> OpenAICompatibleProvider:
+    kw.setdefault("retries", 0)
+    return OpenAICompatibleProvider(url, "", "mock-model", stream=True, **kw)
+
+
+def test_parser_emits_cards_across_chunk_boundaries():
+    parser = CardStreamParser()
+    out = []
+    for i in range(0, len(CONTENT), 7):
+        out.extend(parser.feed(CONTENT[i:i + 7]))
+    assert out == CARDS
+
+
+def test_streams_cards_incrementally(stub_server):
+    server = stub_server(lambda h, body, n: send_sse(h, CONTENT))
+    prov = make_provider(server.url)
+    seen = []
+    card = prov.summarize(INFO, on_card=lambda i, c: seen.append((i, c["title"])))
+    assert card["raw_response"]["stream"] is True
+    assert seen == [(0, "Card 0"), (1, "Card 1"), (2, "Card 2")]
+    assert card["timeline"] == CARDS
+
+
+def test_retry_mid_stream_restarts_parser(stub_server):
+    def respond(h, body, n):
+        if n == 1:
+            send_sse(h, CONTENT, chunks=8, stall_after=4, stall=1.0)
+        else:
+            send_sse(h, CONTENT)
+
+    server = stub_server(respond)
+    prov = make_provider(server.url, retries=1, backoff=0.01, read_timeout=0.3)
+    seen = []
+    streamed = []
+
+    def on_card(i, c):
+        seen.append(i)
+        del streamed[i:]
+        streamed.append(c)
+
+    card = prov.summarize(INFO, on_card=on_card)
+    assert server.requests == 2
+    assert seen[-3:] == [0, 1, 2]
+    assert streamed == CARDS
+    assert card["timeline"] == CARDS
+
+
+def test_falls_back_when_streaming_is_rejected(stub_server):
+    server = stub_server(lambda h, body, n: send_json(h, 400, {"error": "no stream"}) if body.get("stream") else send_json(h, 200, COMPLETION))
+    prov = make_provider(server.url)
+    card = prov.summarize(INFO)
+    assert card["timeline"] == CARDS
+    assert prov._stream_ok is False
+    prov.summarize(INFO)
+    assert [b.get("stream") for b in server.bodies] == [True, False, False]
+
+
+def test_non_streaming_server_answers_stream_request(stub_server):
+    server = stub_server(lambda h, body, n: send_json(h, 200, COMPLETION))
+    prov = make_provider(server.url)
+    seen = []
+    card = prov.summarize(INFO, on_card=lambda i, c: seen.append(i))
+    assert card["timeline"] == CARDS
+    assert seen == []
+    assert server.requests == 1
@@ -0,0 +1,73 @@
+import time
+import sqlite3
+import pytest
+from app.web import EventHub, create_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = create_app()
+    store = app.config["STORE"]
+    for i in range(40):
+        store.put(1000 + i, {"summary": f"Summary {i} " * 10, "timeline": []})
+    yield app.test_client()
+    store.close()
+
+
+def test_list_rejects_before_and_after(client):
+    assert client.get("/api/analyses?before=1020").status_code == 200
+    assert client.get("/api/analyses?after=1020").status_code == 200
+    assert client.get("/api/analyses?before=1030&after=1010").status_code == 400
+
+
+@pytest.mark.parametrize("header, gz", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("deflate, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, identity", False),
+    ("*;q=0.1", True),
+    ("*, gzip;q=0", False),
+    ("identity", False),
+])
+def test_gzip_honours_q_values(client, header, gz):
+    r = client.get("/api/analyses", headers={"Accept-Encoding": header})
+    assert r.status_code == 200
+    assert (r.headers.get("Content-Encoding") == "gzip") is gz
+
+
+class FlakyStore:
+    def __init__(self, total: int, fail_on: int):
+        self.total = total
+        self.fail_on = fail_on
+        self.calls = 0
+        self.sig = 0
+
+    def last_event_id(self) -> int:
+        return 0
+
+    def signature(self):
+        return self.sig
+
+    def events_since(self, after_id: int, limit: int = 500):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise sqlite3.OperationalError("database is locked")
+        return [(i, "analysis", "{}") for i in range(after_id + 1, min(self.total, after_id + limit) + 1)]
+
+
+def test_event_hub_survives_store_errors_while_draining():
+    store = FlakyStore(total=510, fail_on=2)
+    hub = EventHub(store, poll_seconds=0.01)
+    hub.subscribe()
+    try:
+        store.sig = 1
+        deadline = time.monotonic() + 5
+        while hub.last_id < 510 and time.monotonic() < deadline:
+            hub.wait(hub.last_id, 0.5)
+        assert hub.last_id == 510
+        assert store.calls >= 3
+        assert hub._thread.is_alive()
+    finally:
+        hub.unsubscribe()